@@ -0,0 +1,269 @@
+"""Asynchronous (ASGI) serving mode for the web app.
+
+Run it with any ASGI server, e.g. ``uvicorn asgi:app``. Progress streams,
+Spotify searches and job submission are handled as coroutines: an idle SSE
+connection is just a parked coroutine rather than a blocked worker thread,
+so one process can hold thousands of them. Blocking work (Spotify calls,
+starting jobs) runs in a thread pool, and the download jobs themselves run
+in their background threads exactly as under Flask. Every other route is
+served by the Flask app through a small WSGI bridge. The app is initialized
+(cleanup, job resumption) at lifespan startup, not on import.
+"""
+import sys
+import json
+import asyncio
+import logging
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+from werkzeug.formparser import parse_form_data
+
+import webapp
+from config import PROGRESS_FLUSH_HZ
+
+logger = logging.getLogger(__name__)
+
+# Threads available for blocking calls made on behalf of requests
+ASGI_EXECUTOR_WORKERS = 32
+# Seconds between SSE keepalive comments on an idle progress stream
+SSE_KEEPALIVE_INTERVAL = 15
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_EXECUTOR_WORKERS, thread_name_prefix='asgi')
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call in the request thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+async def read_body(receive) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return body
+
+
+async def send_json(send, payload: Dict, status: int = 200, headers: Optional[Dict[str, str]] = None):
+    body = json.dumps(payload).encode()
+    response_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    response_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def wsgi_environ(scope: Dict, body: bytes) -> Dict:
+    """Build a WSGI environ for an ASGI HTTP request."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').lower()
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def header(scope: Dict, name: bytes) -> Optional[str]:
+    for key, value in scope['headers']:
+        if key.lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def search(scope, receive, send):
+    params = parse_qs(scope['query_string'].decode())
+    payload, status = await run_blocking(
+        webapp.search_spotify,
+        params.get('q', [None])[0],
+        params.get('offset', [0])[0],
+        params.get('limit', [5])[0]
+    )
+    await send_json(send, payload, status)
+
+
+async def download(scope, receive, send):
+    body = await read_body(receive)
+    # The page posts multipart FormData; reuse Werkzeug's parser for it
+    _, form, _ = parse_form_data(wsgi_environ(scope, body))
+    payload, status, headers = await run_blocking(
+        webapp.submit_download, form.get('spotify_url'), form.get('format')
+    )
+    await send_json(send, payload, status, headers)
+
+
+async def progress(scope, receive, send, queue_id: str):
+    """Stream a job's progress channel as SSE without holding a thread."""
+    last_event_id = header(scope, b'last-event-id') or parse_qs(
+        scope['query_string'].decode()
+    ).get('last_event_id', [None])[0]
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    async def send_event(data: Dict, message_id: Optional[int] = None):
+        prefix = f"id: {message_id}\n" if message_id is not None else ''
+        await send({'type': 'http.response.body', 'body': f"{prefix}data: {json.dumps(data)}\n\n".encode(),
+                    'more_body': True})
+
+    state = webapp.progress_states.get(queue_id)
+    if state is None:
+        await send_event({'type': 'error', 'message': 'Invalid queue ID'})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    disconnected = asyncio.Event()
+
+    def listener():
+        loop.call_soon_threadsafe(wakeup.set)
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+        wakeup.set()
+
+    state.add_listener(listener)
+    watcher = asyncio.ensure_future(watch_disconnect())
+    started = loop.time()
+    try:
+        await send_event({'type': 'connected', 'queue_id': queue_id})
+        while not disconnected.is_set():
+            if loop.time() - started > webapp.MAX_CONNECTION_AGE.total_seconds():
+                await send_event({'type': 'timeout'})
+                break
+
+            wakeup.clear()
+            messages, closed = state.read(last_event_id, timeout=0)
+            for message_id, data in messages:
+                if message_id is not None:
+                    last_event_id = message_id
+                await send_event(data, message_id)
+            if closed:
+                break
+
+            if not messages:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+            # Let updates accumulate so they are coalesced into the next flush
+            await asyncio.sleep(1 / PROGRESS_FLUSH_HZ)
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        logger.debug(f"Client disconnected from queue {queue_id}")
+    finally:
+        state.remove_listener(listener)
+        watcher.cancel()
+
+
+async def wsgi_fallback(scope, receive, send):
+    """Serve a request with the Flask app, keeping blocking work off the event loop."""
+    environ = wsgi_environ(scope, await read_body(receive))
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+        return lambda data: None
+
+    def call_app():
+        body = webapp.app(environ, start_response)
+        return body, iter(body)
+
+    body, chunks = await run_blocking(call_app)
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': response['status'],
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response['headers']],
+        })
+        # Streamed bodies (e.g. a following ZIP) may block between chunks
+        while True:
+            chunk = await run_blocking(next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(body, 'close'):
+            await run_blocking(body.close)
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await run_blocking(webapp.create_app)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    if scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    path, method = scope['path'], scope['method']
+    if path == '/search' and method == 'GET':
+        await search(scope, receive, send)
+    elif path == '/download' and method == 'POST':
+        await download(scope, receive, send)
+    elif path.startswith('/progress/') and method == 'GET':
+        await progress(scope, receive, send, path[len('/progress/'):])
+    else:
+        await wsgi_fallback(scope, receive, send)
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("Error: the ASGI mode needs an ASGI server, e.g. pip install uvicorn")
+        sys.exit(1)
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -1,30 +1,383 @@
-from pydub import AudioSegment
 import os
-from typing import Optional
+import atexit
+import shutil
+import subprocess
+import threading
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from config import AUDIO_QUALITY, AUDIO_SAMPLE_RATE, AUDIO_CHANNELS, AUDIO_PASSTHROUGH, CONVERSION_WORKERS
+from metrics import CONVERSION_FAILURES, CONVERSION_SECONDS, get_metrics
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg encoder, container (muxer), sample rate and whether a bitrate applies,
+# per output format. Opus only supports 48 kHz among the common rates.
+OUTPUT_FORMATS = {
+    'mp3': {'codec': 'libmp3lame', 'muxer': 'mp3', 'sample_rate': AUDIO_SAMPLE_RATE, 'lossy': True},
+    'wav': {'codec': 'pcm_s16le', 'muxer': 'wav', 'sample_rate': AUDIO_SAMPLE_RATE, 'lossy': False},
+    'opus': {'codec': 'libopus', 'muxer': 'opus', 'sample_rate': 48000, 'lossy': True},
+    'm4a': {'codec': 'aac', 'muxer': 'ipod', 'sample_rate': AUDIO_SAMPLE_RATE, 'lossy': True},
+    'flac': {'codec': 'flac', 'muxer': 'flac', 'sample_rate': AUDIO_SAMPLE_RATE, 'lossy': False},
+}
+
+# Source codec name prefixes (as reported by yt-dlp/ffprobe) that can be
+# stream-copied into each output format without re-encoding
+PASSTHROUGH_CODECS = {
+    'mp3': ('mp3',),
+    'opus': ('opus',),
+    'm4a': ('mp4a', 'aac'),
+    'flac': ('flac',),
+}
 
 class AudioConverter:
     @staticmethod
     def convert_format(
         input_path: str,
         output_format: str,
-        output_path: Optional[str] = None
+        output_path: Optional[str] = None,
+        source_codec: Optional[str] = None,
+        keep_input: bool = False
+    ) -> str:
+        """Convert audio file to specified format.
+
+        Remuxes without re-encoding when the source codec already matches the
+        target, otherwise uses a single streaming ffmpeg pass, and falls back
+        to decoding through pydub when ffmpeg is unavailable or fails. The
+        input file is removed afterwards unless keep_input is set.
+        """
+        return AudioConverter.convert_with_method(input_path, output_format, output_path, source_codec, keep_input)[0]
+
+    @staticmethod
+    def convert_with_method(
+        input_path: str,
+        output_format: str,
+        output_path: Optional[str] = None,
+        source_codec: Optional[str] = None,
+        keep_input: bool = False
+    ) -> Tuple[str, str]:
+        """Like convert_format, but return (output path, method used: remux, ffmpeg or pydub)."""
+        # If no output path specified, replace extension of input path
+        if not output_path:
+            output_path = os.path.splitext(input_path)[0] + '.' + output_format
+
+        if shutil.which('ffmpeg') and output_format in OUTPUT_FORMATS:
+            if AUDIO_PASSTHROUGH and AudioConverter.can_passthrough(
+                source_codec or AudioConverter.probe_codec(input_path), output_format
+            ):
+                try:
+                    return _timed_conversion('remux', AudioConverter.remux,
+                                             input_path, output_format, output_path, keep_input), 'remux'
+                except Exception as e:
+                    logger.warning(f"Remux failed, transcoding instead: {str(e)}")
+            try:
+                return _timed_conversion('ffmpeg', AudioConverter.transcode,
+                                         input_path, output_format, output_path, keep_input), 'ffmpeg'
+            except Exception as e:
+                logger.warning(f"ffmpeg transcode failed, falling back to pydub: {str(e)}")
+        return _timed_conversion('pydub', AudioConverter.convert_with_pydub,
+                                 input_path, output_format, output_path, keep_input), 'pydub'
+
+    @staticmethod
+    def can_passthrough(source_codec: Optional[str], output_format: str) -> bool:
+        """Return True if source_codec can be stream-copied into output_format."""
+        if not source_codec:
+            return False
+        return source_codec.lower().startswith(PASSTHROUGH_CODECS.get(output_format, ()))
+
+    @staticmethod
+    def probe_codec(input_path: str) -> Optional[str]:
+        """Return the codec of the first audio stream, or None if it cannot be probed."""
+        if not shutil.which('ffprobe'):
+            return None
+        result = subprocess.run(
+            [
+                'ffprobe', '-v', 'error', '-select_streams', 'a:0',
+                '-show_entries', 'stream=codec_name', '-of', 'default=nw=1:nk=1',
+                input_path
+            ],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip() or None
+
+    @staticmethod
+    def remux(input_path: str, output_format: str, output_path: str, keep_input: bool = False) -> str:
+        """Copy the audio stream into the target container without re-encoding."""
+        muxer = OUTPUT_FORMATS[output_format]['muxer']
+        return AudioConverter._run_ffmpeg(input_path, output_path, ['-c:a', 'copy', '-f', muxer], keep_input)
+
+    @staticmethod
+    def transcode(input_path: str, output_format: str, output_path: str, keep_input: bool = False) -> str:
+        """Transcode straight from the source file in one ffmpeg pass.
+
+        ffmpeg decodes and encodes in a stream, so neither a WAV intermediate
+        nor the full decoded PCM is ever held on disk or in memory.
+        """
+        spec = OUTPUT_FORMATS[output_format]
+        args = [
+            '-ar', str(spec['sample_rate']),
+            '-ac', str(AUDIO_CHANNELS),
+            '-c:a', spec['codec'],
+        ]
+        if spec['lossy']:
+            args += ['-b:a', f"{AUDIO_QUALITY}k"]
+        return AudioConverter._run_ffmpeg(input_path, output_path, args + ['-f', spec['muxer']], keep_input)
+
+    @staticmethod
+    def _run_ffmpeg(input_path: str, output_path: str, output_args: list, keep_input: bool) -> str:
+        """Run ffmpeg into a temporary file, rename it into place and drop the input."""
+        tmp_path = output_path + '.part'
+        command = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+            '-i', input_path,
+            '-vn',
+            *output_args,
+            tmp_path
+        ]
+        try:
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise Exception(result.stderr.strip() or f"ffmpeg exited with {result.returncode}")
+            os.replace(tmp_path, output_path)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise Exception(f"Conversion failed: {str(e)}")
+
+        if output_path != input_path and not keep_input:
+            os.remove(input_path)
+        return output_path
+
+    @staticmethod
+    def convert_with_pydub(
+        input_path: str,
+        output_format: str,
+        output_path: str,
+        keep_input: bool = False
     ) -> str:
-        """Convert audio file to specified format."""
+        """Convert by decoding the whole file into memory with pydub."""
+        from pydub import AudioSegment
+
         try:
-            # Load the audio file
+            spec = OUTPUT_FORMATS.get(output_format, {})
+
+            # Load the audio file and normalize sample rate and channel layout
             audio = AudioSegment.from_file(input_path)
-            
-            # If no output path specified, replace extension of input path
-            if not output_path:
-                output_path = os.path.splitext(input_path)[0] + '.' + output_format
-            
-            # Export in the desired format
-            audio.export(output_path, format=output_format)
-            
+            audio = audio.set_frame_rate(spec.get('sample_rate', AUDIO_SAMPLE_RATE)).set_channels(AUDIO_CHANNELS)
+
+            # Export in the desired format under a temporary name, then move it into place
+            tmp_path = output_path + '.part'
+            audio.export(
+                tmp_path,
+                format=spec.get('muxer', output_format),
+                codec=spec.get('codec'),
+                bitrate=f"{AUDIO_QUALITY}k" if spec.get('lossy') else None
+            ).close()
+            os.replace(tmp_path, output_path)
+
             # Remove original file if output path is different
-            if output_path != input_path:
+            if output_path != input_path and not keep_input:
                 os.remove(input_path)
-            
+
             return output_path
         except Exception as e:
             raise Exception(f"Conversion failed: {str(e)}")
+
+    @staticmethod
+    def convert_batch(
+        jobs: Iterable[Tuple[str, str, Optional[str]]],
+        max_workers: Optional[int] = None,
+        keep_input: bool = True
+    ) -> Iterator[Dict]:
+        """Convert (input_path, output_format, output_path) jobs on a process pool.
+
+        Results are yielded as each conversion finishes, as dicts with the
+        input and output paths, the elapsed seconds and an error message (None
+        on success). Jobs are submitted through a bounded window so arbitrarily
+        large libraries can be streamed through. If a worker dies, the pool
+        is replaced and the jobs it took down are retried once.
+        """
+        shared = max_workers is None
+        executor = get_conversion_pool() if shared else _create_pool(max_workers)
+        window = (max_workers or CONVERSION_WORKERS) * 4
+        jobs = iter(jobs)
+        pending = {}
+
+        def replace_pool(broken: ProcessPoolExecutor):
+            nonlocal executor
+            if executor is not broken:
+                return
+            logger.warning("Conversion pool broke, starting a new one")
+            if shared:
+                reset_conversion_pool(broken)
+                executor = get_conversion_pool()
+            else:
+                broken.shutdown(wait=False)
+                executor = _create_pool(max_workers)
+
+        def submit(job: Tuple[str, str, Optional[str]], retry: bool = False):
+            try:
+                future = executor.submit(_convert_job, *job, keep_input)
+            except BrokenProcessPool:
+                replace_pool(executor)
+                future = executor.submit(_convert_job, *job, keep_input)
+            pending[future] = (job, executor, retry)
+
+        def submit_next() -> bool:
+            job = next(jobs, None)
+            if job is None:
+                return False
+            submit(job)
+            return True
+
+        try:
+            while len(pending) < window and submit_next():
+                pass
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, pool, retried = pending.pop(future)
+                    input_path, _, output_path = job
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool as e:
+                        # Every job on the pool fails with the worker that died
+                        replace_pool(pool)
+                        if not retried:
+                            submit(job, retry=True)
+                            continue
+                        result = {'input': input_path, 'output': output_path, 'seconds': 0.0, 'error': str(e)}
+                    except Exception as e:
+                        result = {'input': input_path, 'output': output_path, 'seconds': 0.0, 'error': str(e)}
+                    get_metrics().replay(result.pop('metrics', None))
+                    yield result
+                    submit_next()
+        finally:
+            for future in pending:
+                future.cancel()
+            if max_workers is not None:
+                executor.shutdown(wait=False)
+
+    @staticmethod
+    def pcm_size(duration: float) -> int:
+        """Return the size in bytes of the 16-bit PCM a track of this duration decodes to."""
+        return int(duration * AUDIO_SAMPLE_RATE * AUDIO_CHANNELS * 2)
+
+
+def _timed_conversion(method: str, convert, *args) -> str:
+    """Run one conversion method, recording its duration or its failure."""
+    started = time.monotonic()
+    try:
+        output_path = convert(*args)
+    except Exception:
+        CONVERSION_FAILURES.inc(method=method)
+        raise
+    CONVERSION_SECONDS.observe(time.monotonic() - started, method=method)
+    return output_path
+
+
+def convert_in_worker(
+    input_path: str,
+    output_format: str,
+    output_path: Optional[str],
+    source_codec: Optional[str] = None
+) -> Tuple[Optional[str], Optional[str], Optional[str], List]:
+    """Run convert_with_method in a pool worker.
+
+    Returns (output path, method used, error message, metric samples); the
+    caller replays the samples so the worker's conversion metrics reach its
+    registry.
+    """
+    with get_metrics().capture() as samples:
+        try:
+            output_path, method = AudioConverter.convert_with_method(
+                input_path, output_format, output_path, source_codec
+            )
+            return output_path, method, None, samples
+        except Exception as e:
+            return None, None, str(e), samples
+
+
+def _convert_job(input_path: str, output_format: str, output_path: Optional[str], keep_input: bool) -> Dict:
+    """Run one conversion inside a pool worker and report the outcome."""
+    started = time.monotonic()
+    with get_metrics().capture() as samples:
+        try:
+            output_path = AudioConverter.convert_format(input_path, output_format, output_path, keep_input=keep_input)
+            error = None
+        except Exception as e:
+            error = str(e)
+    return {
+        'input': input_path,
+        'output': output_path,
+        'seconds': round(time.monotonic() - started, 3),
+        'error': error,
+        'metrics': samples
+    }
+
+
+def _create_pool(max_workers: int) -> ProcessPoolExecutor:
+    # Workers are forked from a single-threaded fork server rather than from
+    # this process, whose pipeline, web and SQLite threads may hold locks a
+    # forked child would inherit in a locked state. The server preloads this
+    # module so each worker starts without re-importing it; as with spawn,
+    # workers load the entry-point script as __mp_main__, so entry points keep
+    # their work under a __main__ guard.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['__main__', __name__])
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+    return ProcessPoolExecutor(max_workers=max_workers)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_conversion_pool() -> ProcessPoolExecutor:
+    """Return the process-wide conversion pool, sized to CONVERSION_WORKERS."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = _create_pool(CONVERSION_WORKERS)
+        return _shared_pool
+
+
+@atexit.register
+def shutdown_conversion_pool():
+    """Stop the shared pool's workers, waiting for running conversions (runs at exit)."""
+    global _shared_pool
+    with _shared_pool_lock:
+        pool, _shared_pool = _shared_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def reset_conversion_pool(broken: ProcessPoolExecutor):
+    """Drop the shared pool after a worker died, unless it was already replaced."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is broken:
+            _shared_pool = None
+    broken.shutdown(wait=False)
+
+
+def run_in_conversion_pool(func: Callable, *args) -> Any:
+    """Run func(*args) on the shared conversion pool and return its result.
+
+    A worker that crashes or is killed breaks the whole pool for good; the
+    pool is then replaced and the call retried once on the new one.
+    """
+    pool = get_conversion_pool()
+    try:
+        return pool.submit(func, *args).result()
+    except BrokenProcessPool:
+        logger.warning("Conversion pool broke, starting a new one")
+        reset_conversion_pool(pool)
+        return get_conversion_pool().submit(func, *args).result()
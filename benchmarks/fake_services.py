@@ -0,0 +1,256 @@
+"""Local stand-ins for the Spotify Web API and the media source.
+
+FakeSpotifyServer answers the token, playlist, playlist item and track
+endpoints the downloader calls. Playlist IDs encode their size
+(``pl500n1`` has 500 tracks), every response can be delayed by a fixed
+latency, and a fraction of API calls can be answered with HTTP 429 and a
+Retry-After header.
+
+FakeMediaServer serves a generated WAV file for any track ID at
+``/media/<track_id>.wav``; yt-dlp's generic extractor downloads it like
+any direct media link. index_entry() builds the YouTube index entry that
+points a track at it, so no search is needed.
+"""
+import io
+import re
+import json
+import math
+import time
+import wave
+import random
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+PLAYLIST_ID_PATTERN = re.compile(r'pl(\d+)n\w*')
+
+
+def playlist_id(size: int, nonce: int) -> str:
+    """Return a playlist ID the fake Spotify server resolves to `size` tracks."""
+    return f"pl{size}n{nonce}"
+
+
+def track_id(playlist: str, position: int) -> str:
+    return f"{playlist}t{position}"
+
+
+def fake_track(track: str, position: int) -> Dict:
+    return {
+        'id': track,
+        'name': f"Track {position}",
+        'artists': [{'name': f"Artist {position % 50}"}],
+        'album': {'name': f"Album {position % 20}"},
+    }
+
+
+def generate_wav(seconds: float, sample_rate: int = 44100) -> bytes:
+    """Return a stereo 16-bit WAV file holding a 440 Hz tone."""
+    period = [int(8000 * math.sin(2 * math.pi * 440 * i / sample_rate)) for i in range(sample_rate // 440 * 4)]
+    frames = b''.join(struct.pack('<hh', sample, sample) for sample in period)
+    total_frames = int(seconds * sample_rate)
+    data = (frames * (total_frames // len(period) + 1))[:total_frames * 4]
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(data)
+    return buffer.getvalue()
+
+
+class _Server:
+    """A threaded HTTP server running in a background thread."""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self):
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> str:
+        server = self
+
+        class Handler(self.handler_class):
+            service = server
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+
+class _SpotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, payload: Dict, status: int = 200, headers: Optional[Dict] = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path.endswith('/api/token'):
+            self.send_json({'access_token': 'fake-token', 'token_type': 'Bearer', 'expires_in': 3600})
+        else:
+            self.send_json({'error': {'status': 404, 'message': 'Not found'}}, 404)
+
+    def do_GET(self):
+        service = self.service
+        service.count_request()
+        if service.latency:
+            time.sleep(service.latency)
+        if service.should_throttle():
+            self.send_json({'error': {'status': 429, 'message': 'API rate limit exceeded'}}, 429,
+                           {'Retry-After': str(service.retry_after)})
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip('/').split('/')[1:]  # drop the 'v1' prefix
+        if parts[:1] == ['playlists'] and len(parts) == 2:
+            self.send_json(service.playlist(parts[1]))
+        elif parts[:1] == ['playlists'] and len(parts) == 3 and parts[2] in ('items', 'tracks'):
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', ['100'])[0])
+            self.send_json(service.playlist_items(parts[1], offset, limit))
+        elif parts == ['tracks']:
+            ids = query.get('ids', [''])[0].split(',')
+            self.send_json({'tracks': [service.track(track) for track in ids]})
+        elif parts[:1] == ['tracks'] and len(parts) == 2:
+            self.send_json(service.track(parts[1]))
+        else:
+            self.send_json({'error': {'status': 404, 'message': 'Not found'}}, 404)
+
+
+class FakeSpotifyServer(_Server):
+    """Spotify accounts and Web API stand-in with injectable latency and 429s."""
+
+    handler_class = _SpotifyHandler
+
+    def __init__(self, latency: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 1, seed: int = 0):
+        super().__init__()
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.throttled = 0
+        self._random = random.Random(seed)
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/v1/"
+
+    @property
+    def token_url(self) -> str:
+        return f"{self.url}/api/token"
+
+    def should_throttle(self) -> bool:
+        with self._lock:
+            if self._random.random() < self.throttle_rate:
+                self.throttled += 1
+                return True
+        return False
+
+    @staticmethod
+    def playlist_size(playlist: str) -> int:
+        match = PLAYLIST_ID_PATTERN.fullmatch(playlist)
+        return int(match.group(1)) if match else 0
+
+    def playlist(self, playlist: str) -> Dict:
+        return {
+            'id': playlist,
+            'name': f"Benchmark playlist {playlist}",
+            'snapshot_id': f"{playlist}-snapshot",
+            'tracks': {'total': self.playlist_size(playlist)},
+        }
+
+    def playlist_items(self, playlist: str, offset: int, limit: int) -> Dict:
+        total = self.playlist_size(playlist)
+        positions = range(offset, min(offset + limit, total))
+        next_url = None
+        if offset + limit < total:
+            next_url = f"{self.api_url}playlists/{playlist}/items?offset={offset + limit}&limit={limit}"
+        return {
+            'items': [{'track': fake_track(track_id(playlist, i), i)} for i in positions],
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'next': next_url,
+        }
+
+    def track(self, track: str) -> Dict:
+        position = int(track.rsplit('t', 1)[-1]) if 't' in track else 0
+        return fake_track(track, position)
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    def send_media_headers(self) -> bool:
+        if not re.fullmatch(r'/media/\w+\.wav', urlparse(self.path).path):
+            self.send_error(404)
+            return False
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Content-Length', str(len(self.service.media)))
+        self.end_headers()
+        return True
+
+    def do_HEAD(self):
+        self.send_media_headers()
+
+    def do_GET(self):
+        self.service.count_request()
+        if self.service.latency:
+            time.sleep(self.service.latency)
+        if self.send_media_headers():
+            self.wfile.write(self.service.media)
+
+
+class FakeMediaServer(_Server):
+    """Serves a generated WAV file of `seconds` length for any track."""
+
+    handler_class = _MediaHandler
+
+    def __init__(self, seconds: float = 3.0, latency: float = 0.0):
+        super().__init__()
+        self.seconds = seconds
+        self.latency = latency
+        self.media = generate_wav(seconds)
+
+    def media_url(self, track: str) -> str:
+        return f"{self.url}/media/{track}.wav"
+
+    def index_entry(self, track: str) -> Dict:
+        """Return a YouTube index entry pointing the track at this server."""
+        return {
+            'video_id': track,
+            'url': self.media_url(track),
+            'title': track,
+            'format_id': None,
+            'ext': 'wav',
+            'acodec': 'pcm_s16le',
+            'abr': 1411,
+            'resolved_at': time.time(),
+        }
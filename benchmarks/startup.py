@@ -0,0 +1,100 @@
+"""Startup time and import hygiene of the entry points.
+
+Each scenario runs in a fresh interpreter, several times, and reports the
+median wall time. The run fails (exit status 1) if a scenario loads one of
+the heavy modules that must stay lazy, starts threads on import, or, with
+--max-ms, is slower than the budget:
+
+    python benchmarks/startup.py --runs 5 --max-ms 800
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported when they are actually used
+HEAVY_MODULES = ('spotipy', 'yt_dlp', 'pydub', 'tqdm', 'requests')
+
+# Child code reports what the scenario left behind in the interpreter
+REPORT = """
+import sys, json, threading
+print(json.dumps({
+    'heavy': sorted(m for m in %r if m in sys.modules),
+    'threads': threading.active_count(),
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_main(*argv) -> str:
+    return (
+        "import sys, runpy\n"
+        f"sys.argv = ['main.py', {', '.join(repr(a) for a in argv)}]\n"
+        "try:\n"
+        "    runpy.run_path('main.py', run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+    )
+
+
+SCENARIOS = {
+    'import webapp': 'import webapp\n',
+    'import asgi': 'import asgi\n',
+    'main.py --help': run_main('--help'),
+    'main.py convert --help': run_main('convert', '--help'),
+}
+
+
+def run_scenario(code: str) -> dict:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', code + REPORT],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    elapsed = time.perf_counter() - started
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['seconds'] = elapsed
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure entry point startup time')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per scenario')
+    parser.add_argument('--max-ms', type=float, default=None, help='Fail if a median exceeds this')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    baseline = statistics.median(run_scenario('')['seconds'] for _ in range(args.runs))
+    results = {}
+    failures = []
+    for name, code in SCENARIOS.items():
+        reports = [run_scenario(code) for _ in range(args.runs)]
+        median_ms = statistics.median(r['seconds'] for r in reports) * 1000
+        heavy = reports[-1]['heavy']
+        threads = reports[-1]['threads']
+        results[name] = {'median_ms': round(median_ms, 1), 'heavy_modules': heavy, 'threads': threads}
+        if heavy:
+            failures.append(f"{name}: imported {', '.join(heavy)}")
+        if threads > 1:
+            failures.append(f"{name}: started {threads - 1} thread(s) on import")
+        if args.max_ms is not None and median_ms > args.max_ms:
+            failures.append(f"{name}: {median_ms:.0f} ms exceeds {args.max_ms:.0f} ms")
+
+    if args.json:
+        print(json.dumps({'interpreter_ms': round(baseline * 1000, 1), 'scenarios': results,
+                          'failures': failures}, indent=2))
+    else:
+        print(f"{'bare interpreter':26} {baseline * 1000:8.1f} ms")
+        for name, result in results.items():
+            print(f"{name:26} {result['median_ms']:8.1f} ms")
+        for failure in failures:
+            print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+"""Offline end-to-end benchmarks.
+
+Runs entirely against local stand-ins (see fake_services.py): a fake
+Spotify Web API and a media server whose URLs are seeded into the YouTube
+index, in a throwaway working directory so caches start cold. Results are
+written as JSON for regression tracking:
+
+    python benchmarks/suite.py --tracks 200 --clients 4 --output results.json
+    python benchmarks/suite.py --only playlist --latency 0.05 --throttle-rate 0.02
+
+Benchmarks:
+    playlist  SpotifyDownloader.get_playlist_tracks (pagination)
+    download  SpotifyDownloader.download_playlist_concurrent
+    convert   AudioConverter.convert_format
+    webapp    POST /download + the /progress SSE stream under N clients
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import itertools
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeMediaServer, FakeSpotifyServer, playlist_id, track_id
+
+BENCHMARKS = ('playlist', 'download', 'convert', 'webapp')
+
+_nonces = itertools.count(1)
+
+
+def rss_bytes() -> int:
+    """Return the current resident set size of this process."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRSS:
+    """Sample RSS in the background and keep the peak."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.baseline = rss_bytes()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def mb(value: float) -> float:
+    return round(value / 1024 ** 2, 2)
+
+
+def seed_index(media: FakeMediaServer, playlist: str, size: int):
+    """Point every track of a fake playlist at the media server."""
+    from youtube_index import get_youtube_index
+    index = get_youtube_index()
+    for position in range(size):
+        track = track_id(playlist, position)
+        index.put(track, media.index_entry(track))
+
+
+def bench_playlist(args, spotify: FakeSpotifyServer, media: FakeMediaServer) -> Dict:
+    from spotify_downloader import SpotifyDownloader
+    # No metadata cache, so every run paginates the whole playlist
+    downloader = SpotifyDownloader('benchmark', 'benchmark', use_cache=False)
+    durations = []
+    requests_per_run = 0
+    throttled_before = spotify.throttled
+    for _ in range(args.repeat):
+        playlist = playlist_id(args.tracks, next(_nonces))
+        requests_before = spotify.requests
+        started = time.perf_counter()
+        tracks = downloader.get_playlist_tracks(playlist)
+        durations.append(time.perf_counter() - started)
+        requests_per_run = spotify.requests - requests_before
+        assert len(tracks) == args.tracks, f"expected {args.tracks} tracks, got {len(tracks)}"
+    seconds = statistics.median(durations)
+    return {
+        'tracks': args.tracks,
+        'runs': args.repeat,
+        'seconds': round(seconds, 4),
+        'tracks_per_second': round(args.tracks / seconds, 1),
+        'api_requests_per_run': requests_per_run,
+        'throttled_responses': spotify.throttled - throttled_before,
+    }
+
+
+def bench_download(args, spotify: FakeSpotifyServer, media: FakeMediaServer) -> Dict:
+    from spotify_downloader import SpotifyDownloader
+    from config import DOWNLOAD_CONCURRENCY_MAX
+    playlist = playlist_id(args.tracks, next(_nonces))
+    tracks = SpotifyDownloader('benchmark', 'benchmark', use_cache=False).get_playlist_tracks(playlist)
+    seed_index(media, playlist, args.tracks)
+    output_dir = os.path.join(os.getcwd(), 'bench-download')
+
+    downloader = SpotifyDownloader('benchmark', 'benchmark')
+    finished_at = []
+    failures = []
+
+    def on_track_done(track, output_path, error):
+        if error:
+            failures.append(error)
+        else:
+            finished_at.append(time.perf_counter())
+
+    with PeakRSS() as memory:
+        started = time.perf_counter()
+        outputs = downloader.download_playlist_concurrent(
+            tracks, args.format, output_dir, max_workers=args.workers, on_track_done=on_track_done
+        )
+        seconds = time.perf_counter() - started
+    workers = args.workers or DOWNLOAD_CONCURRENCY_MAX
+    return {
+        'tracks': args.tracks,
+        'format': args.format,
+        'download_workers': workers,
+        'seconds': round(seconds, 3),
+        'tracks_per_minute': round(len(outputs) / seconds * 60, 1),
+        'time_to_first_track': round(finished_at[0] - started, 3) if finished_at else None,
+        'failed': len(failures),
+        'first_error': failures[0] if failures else None,
+        'baseline_rss_mb': mb(memory.baseline),
+        'peak_rss_mb': mb(memory.peak),
+        'rss_per_worker_mb': mb((memory.peak - memory.baseline) / workers),
+        'download_limiter': downloader.download_limiter.stats(),
+    }
+
+
+def bench_convert(args, spotify: FakeSpotifyServer, media: FakeMediaServer) -> Dict:
+    from audio_converter import AudioConverter
+    work_dir = os.path.join(os.getcwd(), 'bench-convert')
+    os.makedirs(work_dir, exist_ok=True)
+    inputs = []
+    for i in range(args.convert_files):
+        path = os.path.join(work_dir, f"input{i}.source.wav")
+        with open(path, 'wb') as f:
+            f.write(media.media)
+        inputs.append(path)
+
+    durations = []
+    for i, path in enumerate(inputs):
+        output_path = os.path.join(work_dir, f"output{i}.{args.format}")
+        started = time.perf_counter()
+        AudioConverter.convert_format(path, args.format, output_path, keep_input=True)
+        durations.append(time.perf_counter() - started)
+    total = sum(durations)
+    return {
+        'files': len(inputs),
+        'format': args.format,
+        'audio_seconds_per_file': media.seconds,
+        'ms_per_file_p50': round(percentile(durations, 0.5) * 1000, 2),
+        'ms_per_file_p95': round(percentile(durations, 0.95) * 1000, 2),
+        'realtime_factor': round(media.seconds * len(inputs) / total, 1) if total else None,
+    }
+
+
+def bench_webapp(args, spotify: FakeSpotifyServer, media: FakeMediaServer) -> Dict:
+    import requests
+    from werkzeug.serving import make_server
+    import logging
+    import webapp
+    # webapp configures DEBUG logging on import; werkzeug logs every request
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, webapp.create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    playlists = [playlist_id(args.web_tracks, next(_nonces)) for _ in range(args.clients)]
+    for playlist in playlists:
+        seed_index(media, playlist, args.web_tracks)
+
+    def client(playlist: str) -> Dict:
+        result = {'status': None}
+        started = time.perf_counter()
+        response = requests.post(f"{base_url}/download", data={
+            'spotify_url': f"https://open.spotify.com/playlist/{playlist}",
+            'format': args.format,
+        })
+        result['submit'] = time.perf_counter() - started
+        if response.status_code != 200:
+            result['status'] = f"http {response.status_code}"
+            return result
+
+        queue_id = response.json()['queue_id']
+        with requests.get(f"{base_url}/progress/{queue_id}", stream=True, timeout=args.timeout) as stream:
+            for line in stream.iter_lines():
+                now = time.perf_counter()
+                result.setdefault('first_byte', now - started)
+                if not line.startswith(b'data: '):
+                    continue
+                event = json.loads(line[len(b'data: '):])
+                if event.get('type') == 'track' and event.get('status') == 'done':
+                    result.setdefault('first_track', now - started)
+                    result['tracks_done'] = result.get('tracks_done', 0) + 1
+                elif event.get('type') in ('complete', 'error', 'cancelled'):
+                    result['status'] = event['type']
+                    break
+        result['job'] = time.perf_counter() - started
+        return result
+
+    try:
+        with PeakRSS() as memory:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as executor:
+                results = list(executor.map(client, playlists))
+            seconds = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    def summary(key: str) -> Dict:
+        values = [r[key] for r in results if key in r]
+        if not values:
+            return {'p50': None, 'max': None}
+        return {'p50': round(percentile(values, 0.5), 4), 'max': round(max(values), 4)}
+
+    return {
+        'clients': args.clients,
+        'tracks_per_client': args.web_tracks,
+        'format': args.format,
+        'seconds': round(seconds, 3),
+        'completed_jobs': sum(1 for r in results if r['status'] == 'complete'),
+        'statuses': sorted({str(r['status']) for r in results}),
+        'tracks_per_minute': round(sum(r.get('tracks_done', 0) for r in results) / seconds * 60, 1),
+        'submit_seconds': summary('submit'),
+        'sse_first_byte_seconds': summary('first_byte'),
+        'first_track_seconds': summary('first_track'),
+        'job_seconds': summary('job'),
+        'peak_rss_mb': mb(memory.peak),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmarks')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS),
+                        help='Benchmarks to run (default: all)')
+    parser.add_argument('--tracks', type=int, default=200, help='Playlist size for playlist/download')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of the playlist benchmark (median)')
+    parser.add_argument('--workers', type=int, default=None, help='Download workers (default: the app default)')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent web clients')
+    parser.add_argument('--web-tracks', type=int, default=20, help='Playlist size per web client')
+    parser.add_argument('--convert-files', type=int, default=20, help='Files for the convert benchmark')
+    parser.add_argument('--format', default=None,
+                        help='Output format (default: mp3, or wav when ffmpeg is not installed)')
+    parser.add_argument('--latency', type=float, default=0.02, help='Fake Spotify API latency (seconds)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of API calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After sent with each 429 (seconds)')
+    parser.add_argument('--media-latency', type=float, default=0.0, help='Fake media server latency (seconds)')
+    parser.add_argument('--media-seconds', type=float, default=3.0, help='Length of the generated audio')
+    parser.add_argument('--timeout', type=float, default=600, help='Timeout for a web job (seconds)')
+    parser.add_argument('--output', default='-', help='Results JSON file ("-" for stdout)')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary working directory')
+    args = parser.parse_args()
+    args.format = args.format or ('mp3' if shutil.which('ffmpeg') else 'wav')
+
+    spotify = FakeSpotifyServer(latency=args.latency, throttle_rate=args.throttle_rate,
+                                retry_after=args.retry_after)
+    media = FakeMediaServer(seconds=args.media_seconds, latency=args.media_latency)
+    spotify.start()
+    media.start()
+
+    # config derives its paths from the working directory and reads the
+    # endpoints from the environment, so both are set before any app import
+    work_dir = tempfile.mkdtemp(prefix='spotifydl-bench-')
+    os.chdir(work_dir)
+    os.environ.update({
+        'SPOTIFY_API_URL': spotify.api_url,
+        'SPOTIFY_TOKEN_URL': spotify.token_url,
+        'SPOTIFY_CLIENT_ID': 'benchmark',
+        'SPOTIFY_CLIENT_SECRET': 'benchmark',
+    })
+    import logging
+    import config
+    # Console output is not what is being measured
+    config.YTDLP_OPTIONS.update({'quiet': True, 'verbose': False, 'noprogress': True})
+    logging.basicConfig(level=logging.WARNING)
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': bool(shutil.which('ffmpeg')),
+        },
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'keep')},
+        'results': {},
+    }
+    try:
+        for name in BENCHMARKS:
+            if name not in args.only:
+                continue
+            print(f"Running {name} benchmark...", file=sys.stderr)
+            benchmark = globals()[f"bench_{name}"]
+            try:
+                report['results'][name] = benchmark(args, spotify, media)
+            except Exception as e:
+                report['results'][name] = {'error': str(e)}
+    finally:
+        spotify.stop()
+        media.stop()
+        os.chdir(ROOT)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    if any('error' in result for result in report['results'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
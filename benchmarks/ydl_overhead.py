@@ -0,0 +1,106 @@
+"""Per-track YoutubeDL overhead: a fresh instance per track vs the shared pool.
+
+Runs offline. For every track of a simulated playlist it sets up yt-dlp the
+way the downloader does (output template, format, progress hook) and
+renders the output filename, without touching the network. The pooled
+run is repeated as several jobs, each on its own fresh worker threads
+like the pipeline's, checking that every track got its own output path
+and counting the instances the jobs had to build between them:
+
+    python benchmarks/ydl_overhead.py --tracks 500 --workers 8 --jobs 3
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+
+from config import YTDLP_OPTIONS
+from ydl_pool import YoutubeDLPool
+
+FORMAT_SPEC = 'bestaudio[ext=m4a]/bestaudio/best'
+
+
+class NullLogger:
+    """Swallow yt-dlp output; the verbose header is still built, as in the app."""
+
+    def debug(self, msg):
+        pass
+
+    warning = info = error = debug
+
+
+OPTIONS = dict(YTDLP_OPTIONS, logger=NullLogger())
+
+
+def fake_track(i: int):
+    outtmpl = os.path.join('downloads', 'bench', f"Artist {i} - Title {i}.source.%(ext)s")
+    info = {'id': f"video{i:05d}", 'title': f"Title {i}", 'ext': 'm4a', 'webpage_url': f"https://example.com/{i}"}
+    return outtmpl, info
+
+
+def per_track_instances(tracks: int) -> float:
+    started = time.perf_counter()
+    for i in range(tracks):
+        outtmpl, info = fake_track(i)
+        options = dict(OPTIONS, outtmpl=outtmpl, format=FORMAT_SPEC, progress_hooks=[lambda d: None])
+        with yt_dlp.YoutubeDL(options) as ydl:
+            ydl.prepare_filename(info)
+    return time.perf_counter() - started
+
+
+def pooled_instances(tracks: int) -> float:
+    pool = YoutubeDLPool(OPTIONS)
+    started = time.perf_counter()
+    for i in range(tracks):
+        outtmpl, info = fake_track(i)
+        with pool.get(outtmpl=outtmpl, format_spec=FORMAT_SPEC, progress_hook=lambda d: None) as ydl:
+            ydl.prepare_filename(info)
+    return time.perf_counter() - started
+
+
+def concurrent_pooled_instances(tracks: int, workers: int, jobs: int):
+    """Run the pooled setup as jobs on fresh threads; return (seconds, mismatched filenames, instances)."""
+    pool = YoutubeDLPool(OPTIONS)
+
+    def render(i: int) -> bool:
+        outtmpl, info = fake_track(i)
+        with pool.get(outtmpl=outtmpl, format_spec=FORMAT_SPEC, progress_hook=lambda d: None) as ydl:
+            # Yield between configuring and rendering so other workers interleave
+            time.sleep(0)
+            return ydl.prepare_filename(info) == outtmpl.replace('%(ext)s', info['ext'])
+
+    started = time.perf_counter()
+    mismatched = 0
+    for _ in range(jobs):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            mismatched += sum(not ok for ok in executor.map(render, range(tracks)))
+    return time.perf_counter() - started, mismatched, pool.created
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-track YoutubeDL setup overhead')
+    parser.add_argument('--tracks', type=int, default=500, help='Tracks in the simulated playlist')
+    parser.add_argument('--workers', type=int, default=8, help='Threads sharing the pool in the concurrent run')
+    parser.add_argument('--jobs', type=int, default=3, help='Jobs in the concurrent run, each with new threads')
+    args = parser.parse_args()
+
+    before = per_track_instances(args.tracks)
+    after = pooled_instances(args.tracks)
+    concurrent, mismatched, created = concurrent_pooled_instances(args.tracks, args.workers, args.jobs)
+    print(f"Tracks:                  {args.tracks}")
+    print(f"New YoutubeDL per track: {before:8.3f}s total, {before / args.tracks * 1000:7.3f} ms/track")
+    print(f"Pooled YoutubeDL:        {after:8.3f}s total, {after / args.tracks * 1000:7.3f} ms/track")
+    print(f"Speedup:                 {before / after if after else float('inf'):8.1f}x")
+    print(f"Pooled, {args.jobs} jobs x {args.workers} workers: {concurrent:8.3f}s total, {created} instances built, "
+          f"{mismatched} of {args.tracks * args.jobs} tracks rendered another track's path")
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+import re
+import time
+import threading
+import logging
+from concurrent.futures import Future
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from config import (
+    SPOTIFY_CONCURRENCY_INITIAL, SPOTIFY_CONCURRENCY_MAX,
+    DOWNLOAD_CONCURRENCY_INITIAL, DOWNLOAD_CONCURRENCY_MAX,
+    AIMD_DECREASE_FACTOR, AIMD_MIN_IMPROVEMENT, DEFAULT_RETRY_AFTER
+)
+from metrics import CONCURRENCY_LIMIT, THROTTLED
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Parse a Retry-After header (seconds or HTTP date) into seconds."""
+    value = headers.get('Retry-After') if headers else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_chain(error: BaseException) -> Iterator[BaseException]:
+    """Yield an error and the errors it wraps (yt-dlp keeps the underlying one in exc_info)."""
+    seen = set()
+    current = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        exc_info = getattr(current, 'exc_info', None)
+        current = exc_info[1] if exc_info else current.__cause__
+
+
+def _http_status(error: BaseException) -> Optional[int]:
+    response = getattr(error, 'response', None)
+    return (getattr(error, 'http_status', None) or getattr(error, 'status', None)
+            or getattr(response, 'status_code', None) or getattr(response, 'status', None))
+
+
+def throttle_info(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """Return (throttled, Retry-After seconds) for an error raised by an HTTP client.
+
+    Follows wrapped errors and falls back to the message for clients that
+    only report text.
+    """
+    for current in _error_chain(error):
+        if _http_status(current) == 429:
+            response = getattr(current, 'response', None)
+            headers = getattr(current, 'headers', None) or getattr(response, 'headers', None)
+            return True, retry_after_seconds(headers)
+    message = str(error)
+    return ('HTTP Error 429' in message or 'Too Many Requests' in message), None
+
+
+def is_upstream_error(error: BaseException) -> bool:
+    """Return True for server (5xx) and connection errors, as opposed to e.g. a missing video."""
+    for current in _error_chain(error):
+        status = _http_status(current)
+        if isinstance(status, int) and status >= 500:
+            return True
+        if isinstance(current, (ConnectionError, TimeoutError)) or type(current).__name__ == 'TransportError':
+            return True
+    return re.search(r'HTTP Error 5\d\d', str(error)) is not None
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for calls to one upstream service.
+
+    Callers hold a slot() per call and report how it went. After every
+    round of `limit` completed calls the limiter compares throughput
+    (reported units per second) with the previous round: while it improves
+    by at least AIMD_MIN_IMPROVEMENT and the limit was actually reached,
+    the limit grows by one; if it drops after an increase, that step is
+    undone. A throttle response (HTTP 429) multiplies the limit by
+    AIMD_DECREASE_FACTOR and pauses new calls for its Retry-After; other
+    upstream errors shrink the limit by one.
+    """
+
+    def __init__(self, name: str, initial: int, maximum: int, minimum: int = 1):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        CONCURRENCY_LIMIT.set(self.limit, upstream=self.name)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._resume_at = 0.0
+        self._last_change = 0
+        self._previous_throughput: Optional[float] = None
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_started = time.monotonic()
+        self._window_calls = 0
+        self._window_units = 0.0
+        self._window_saturated = False
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the current limit's slots, waiting out any throttle pause."""
+        with self._cond:
+            while True:
+                pause = self._resume_at - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self._in_flight >= self.limit:
+                    self._cond.wait()
+                else:
+                    break
+            self._in_flight += 1
+            if self._in_flight >= self.limit:
+                self._window_saturated = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self, units: float = 1.0):
+        """Record a completed call that transferred `units` (calls, bytes...)."""
+        with self._cond:
+            self._window_calls += 1
+            self._window_units += units
+            if self._window_calls < self.limit:
+                return
+            elapsed = time.monotonic() - self._window_started
+            throughput = self._window_units / elapsed if elapsed > 0 else 0.0
+            previous = self._previous_throughput
+            if previous is not None and throughput < previous * (1 - AIMD_MIN_IMPROVEMENT) \
+                    and self._last_change > 0 and self.limit > self.minimum:
+                self._set_limit(self.limit - 1, f"throughput fell to {throughput:.1f}/s from {previous:.1f}/s")
+            elif self._window_saturated and self.limit < self.maximum and (
+                previous is None or throughput >= previous * (1 + AIMD_MIN_IMPROVEMENT)
+            ):
+                self._set_limit(self.limit + 1, f"throughput {throughput:.1f}/s")
+            else:
+                self._last_change = 0
+            self._previous_throughput = throughput
+            self._reset_window()
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Back off multiplicatively after a 429 and pause for Retry-After seconds."""
+        delay = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+        THROTTLED.inc(upstream=self.name)
+        with self._cond:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+            self._set_limit(int(self.limit * AIMD_DECREASE_FACTOR), f"throttled, pausing {delay:.0f}s")
+            self._previous_throughput = None
+            self._reset_window()
+
+    def on_error(self):
+        """Shrink the limit by one after an upstream (5xx or connection) error."""
+        with self._cond:
+            if self.limit > self.minimum:
+                self._set_limit(self.limit - 1, "upstream error")
+            self._previous_throughput = None
+            self._reset_window()
+
+    def _set_limit(self, limit: int, reason: str):
+        limit = min(max(limit, self.minimum), self.maximum)
+        self._last_change = limit - self.limit
+        if limit != self.limit:
+            logger.info(f"{self.name} concurrency {self.limit} -> {limit}: {reason}")
+            self.limit = limit
+            CONCURRENCY_LIMIT.set(limit, upstream=self.name)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'paused_for': round(max(self._resume_at - time.monotonic(), 0.0), 1),
+            }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    """Return the process-wide limiter for 'spotify' API calls or 'youtube' media downloads."""
+    with _limiters_lock:
+        if name not in _limiters:
+            if name == 'spotify':
+                _limiters[name] = AdaptiveLimiter('Spotify API', SPOTIFY_CONCURRENCY_INITIAL, SPOTIFY_CONCURRENCY_MAX)
+            elif name == 'youtube':
+                _limiters[name] = AdaptiveLimiter('Media download', DOWNLOAD_CONCURRENCY_INITIAL,
+                                                  DOWNLOAD_CONCURRENCY_MAX)
+            else:
+                raise ValueError(f"Unknown limiter: {name}")
+        return _limiters[name]
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result (or its exception). Callers
+    that must not block can claim() the flight and wait on its future instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, Future] = {}
+
+    def claim(self, key: Any) -> Tuple[Future, bool]:
+        """Join the flight for key, starting one if there is none.
+
+        Returns (future, leader). The leader does the work and must finish
+        the flight with resolve(); everyone else waits on the future.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def resolve(self, key: Any, result: Any = None, error: Optional[BaseException] = None):
+        """Finish the flight for key with its result or error, waking its followers."""
+        with self._lock:
+            future = self._calls.pop(key)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Any, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared) where shared is True if another caller ran func."""
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = func()
+        except BaseException as e:
+            self.resolve(key, error=e)
+            raise
+        self.resolve(key, result)
+        return result, False
+
+    def in_flight(self, key: Any) -> bool:
+        with self._lock:
+            return key in self._calls
@@ -7,14 +7,101 @@ os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 # Maximum number of concurrent downloads
 MAX_CONCURRENT_DOWNLOADS = 3
 
+# Playlist pagination: page size (Spotify max is 100), concurrent page
+# requests and the response fields we actually read
+PLAYLIST_PAGE_SIZE = 100
+PLAYLIST_PAGE_WORKERS = 4
+PLAYLIST_FIELDS = 'total,items(track(id,name,artists(name),album(name)))'
+
+# Batch endpoint limits for resolving many IDs at once
+SPOTIFY_TRACKS_BATCH_SIZE = 50
+SPOTIFY_ALBUMS_BATCH_SIZE = 20
+
+# Audio quality (kbps) used for lossy encodes
+AUDIO_QUALITY = '192'
+
+# Staged download pipeline: I/O-bound search threads, download threads
+# (DOWNLOAD_CONCURRENCY_MAX unless overridden) and CPU-bound transcoders
+# sized to the machine, connected by queues of PIPELINE_QUEUE_SIZE items
+PIPELINE_SEARCH_WORKERS = 4
+PIPELINE_TRANSCODE_WORKERS = os.cpu_count() or 2
+PIPELINE_QUEUE_SIZE = 8
+
+# Adaptive (AIMD) concurrency per upstream: Spotify API calls and media
+# downloads start at the initial limit, which is raised while throughput
+# improves and cut on throttling, within [1, maximum]
+SPOTIFY_CONCURRENCY_INITIAL = 4
+SPOTIFY_CONCURRENCY_MAX = 16
+DOWNLOAD_CONCURRENCY_INITIAL = MAX_CONCURRENT_DOWNLOADS
+DOWNLOAD_CONCURRENCY_MAX = 12
+# Factor applied to a limit on HTTP 429, minimum relative throughput gain
+# that earns another slot, and the pause (seconds) when no Retry-After is sent
+AIMD_DECREASE_FACTOR = 0.5
+AIMD_MIN_IMPROVEMENT = 0.05
+DEFAULT_RETRY_AFTER = 5
+# Attempts at a throttled or failing upstream call before giving up
+THROTTLE_MAX_RETRIES = 5
+
+# Spotify Web API and token endpoints; overridable from the environment to
+# point the app at a stand-in server (see benchmarks/fake_services.py)
+SPOTIFY_API_URL = os.environ.get('SPOTIFY_API_URL', 'https://api.spotify.com/v1/')
+SPOTIFY_TOKEN_URL = os.environ.get('SPOTIFY_TOKEN_URL', 'https://accounts.spotify.com/api/token')
+
+# Shared Spotify client: keep-alive connections pooled per host (enough for
+# the adaptive limit's maximum), request timeout in seconds, and how long
+# before expiry the access token is renewed
+SPOTIFY_HTTP_POOL_SIZE = SPOTIFY_CONCURRENCY_MAX
+SPOTIFY_REQUEST_TIMEOUT = 10
+SPOTIFY_TOKEN_REFRESH_MARGIN = 5 * 60
+
+# Web jobs share a global scheduler: total concurrent search/download
+# operations across all jobs, and how many jobs may be admitted at once
+SCHEDULER_MAX_SLOTS = MAX_CONCURRENT_DOWNLOADS * 2
+SCHEDULER_MAX_JOBS = 20
+# Seconds a client is told to wait (Retry-After) when the queue is full
+SCHEDULER_RETRY_AFTER = 30
+
+# Progress updates sent to web clients per second, and how many progress
+# messages each job keeps for subscribers reconnecting with Last-Event-ID
+PROGRESS_FLUSH_HZ = 5
+PROGRESS_BUFFER_SIZE = 256
+
+# Worker processes used for audio conversion (shared by the pipeline and batch conversion)
+CONVERSION_WORKERS = os.cpu_count() or 2
+
+# Persistent track cache shared across jobs and restarts
+CACHE_DIR = os.path.join(os.getcwd(), "cache")
+TRACK_CACHE_DIR = os.path.join(CACHE_DIR, "tracks")
+# Size budget for the track cache (5 GB); least recently used entries are evicted
+TRACK_CACHE_MAX_BYTES = 5 * 1024 ** 3
+
+# Spotify metadata cache: in-memory LRU entries, TTL (seconds) and SQLite backing file
+METADATA_CACHE_SIZE = 10000
+METADATA_CACHE_TTL = 24 * 60 * 60
+METADATA_CACHE_DB = os.path.join(CACHE_DIR, "metadata.sqlite3")
+
+# Spotify search result pages: cached pages, TTL (seconds) and threads
+# prefetching the next page of a search
+SEARCH_CACHE_SIZE = 2000
+SEARCH_CACHE_TTL = 10 * 60
+SEARCH_PREFETCH_WORKERS = 2
+
+# Persistent Spotify track ID -> YouTube video index
+YOUTUBE_INDEX_DB = os.path.join(CACHE_DIR, "youtube_index.sqlite3")
+
+# Journal of web download jobs, used to resume them after a restart
+JOB_JOURNAL_DB = os.path.join(CACHE_DIR, "jobs.sqlite3")
+
+# Web job outputs in DOWNLOAD_DIR: expiry index, how long (seconds) finished
+# files are kept, and a disk budget (10 GB) enforced on every write by
+# evicting the least recently used files of finished jobs
+DOWNLOAD_INDEX_DB = os.path.join(CACHE_DIR, "downloads.sqlite3")
+DOWNLOAD_TTL = 24 * 60 * 60
+DOWNLOAD_DIR_MAX_BYTES = 10 * 1024 ** 3
+
 # YT-DLP Configuration
 YTDLP_OPTIONS = {
     'format': 'bestaudio/best',
-    'postprocessors': [{
-        'key': 'FFmpegExtractAudio',
-        'preferredcodec': 'wav',
-        'preferredquality': '192',
-    }],
     'quiet': False,
     'no_warnings': False,
     'extract_flat': False,
@@ -22,14 +109,23 @@ YTDLP_OPTIONS = {
     'writethumbnail': False,
     'prefer_ffmpeg': True,
     'verbose': True,
-    'postprocessor_args': [
-        '-ar', '44100',
-        '-ac', '2',
-    ],
+}
+
+# Output audio parameters applied when transcoding
+AUDIO_SAMPLE_RATE = 44100
+AUDIO_CHANNELS = 2
+
+# Remux instead of re-encoding when the downloaded codec already matches the target
+AUDIO_PASSTHROUGH = True
+
+# yt-dlp format selectors tried first per output format so passthrough can apply
+PREFERRED_SOURCE_FORMATS = {
+    'opus': 'bestaudio[acodec=opus]',
+    'm4a': 'bestaudio[ext=m4a]',
 }
 
 # File naming template
 FILENAME_TEMPLATE = "{artist} - {title}"
 
 # Supported formats
-SUPPORTED_FORMATS = ['mp3', 'wav']
+SUPPORTED_FORMATS = ['mp3', 'wav', 'opus', 'm4a', 'flac']
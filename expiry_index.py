@@ -0,0 +1,254 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import logging
+from typing import Dict, Set
+
+from config import DOWNLOAD_DIR, DOWNLOAD_INDEX_DB, DOWNLOAD_TTL, DOWNLOAD_DIR_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryIndex:
+    """Index of web job outputs by expiry time and last access.
+
+    Files are registered as they are written, so expired outputs are found
+    with an index range scan instead of walking and stat-ing the download
+    tree. Each job directory has its own row that expires with its newest
+    file and takes leftovers (partial or source files) with it. When the
+    indexed size exceeds the disk budget, the least recently used files of
+    jobs that are not running are evicted on the spot.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DOWNLOAD_INDEX_DB,
+        download_dir: str = DOWNLOAD_DIR,
+        ttl: float = DOWNLOAD_TTL,
+        max_bytes: int = DOWNLOAD_DIR_MAX_BYTES
+    ):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.download_dir = download_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._pinned: Set[str] = set()
+        self._lock = threading.Lock()
+        self.expired_files = 0
+        self.evicted_files = 0
+        self.bytes_expired = 0
+        self.bytes_evicted = 0
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                queue_id TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                queue_id TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS files_expires_at ON files (expires_at)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS files_queue_id ON files (queue_id)')
+        if self._db.execute('PRAGMA user_version').fetchone()[0] == 0:
+            self._seed()
+            self._db.execute('PRAGMA user_version = 1')
+
+    def _seed(self):
+        """Index outputs written before the index existed (runs once, by mtime)."""
+        if not os.path.isdir(self.download_dir):
+            return
+        self._db.execute('BEGIN')
+        for name in os.listdir(self.download_dir):
+            job_path = os.path.join(self.download_dir, name)
+            try:
+                expires_at = os.path.getmtime(job_path) + self.ttl
+            except OSError:
+                continue
+            self._db.execute('INSERT OR IGNORE INTO jobs VALUES (?, ?, ?)', (name, job_path, expires_at))
+            for root, dirs, files in os.walk(job_path):
+                for file in files:
+                    path = os.path.join(root, file)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    self._db.execute(
+                        'INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?)',
+                        (path, name, stat.st_size, stat.st_mtime + self.ttl, stat.st_mtime)
+                    )
+                    self._db.execute(
+                        'UPDATE jobs SET expires_at = MAX(expires_at, ?) WHERE queue_id = ?',
+                        (stat.st_mtime + self.ttl, name)
+                    )
+        self._db.execute('COMMIT')
+        logger.info("Indexed existing downloads for expiry")
+
+    def add_job(self, queue_id: str, path: str):
+        """Register a job directory; it expires DOWNLOAD_TTL after its newest file."""
+        with self._lock:
+            self._db.execute("""
+                INSERT INTO jobs VALUES (?, ?, ?)
+                ON CONFLICT (queue_id) DO UPDATE SET expires_at = MAX(expires_at, excluded.expires_at)
+            """, (queue_id, path, time.time() + self.ttl))
+
+    def add_file(self, queue_id: str, path: str):
+        """Register a finished output and evict other files if over budget."""
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.error(f"Error indexing download {path}: {str(e)}")
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                (path, queue_id, size, now + self.ttl, now)
+            )
+            self._db.execute(
+                'UPDATE jobs SET expires_at = MAX(expires_at, ?) WHERE queue_id = ?', (now + self.ttl, queue_id)
+            )
+            self._evict()
+
+    def touch_job(self, queue_id: str):
+        """Mark a job's files as recently used (e.g. when its ZIP is fetched)."""
+        with self._lock:
+            self._db.execute('UPDATE files SET last_access = ? WHERE queue_id = ?', (time.time(), queue_id))
+
+    def forget_job_files(self, queue_id: str):
+        """Drop the file entries of a job whose files were removed elsewhere."""
+        with self._lock:
+            self._db.execute('DELETE FROM files WHERE queue_id = ?', (queue_id,))
+
+    def pin(self, queue_id: str):
+        """Protect a running job's files from eviction and expiry."""
+        with self._lock:
+            self._pinned.add(queue_id)
+
+    def unpin(self, queue_id: str):
+        with self._lock:
+            self._pinned.discard(queue_id)
+
+    def clear(self):
+        """Forget every entry (after the download directory was wiped)."""
+        with self._lock:
+            self._db.execute('DELETE FROM files')
+            self._db.execute('DELETE FROM jobs')
+
+    def expire(self) -> int:
+        """Remove expired files and job directories; return the bytes reclaimed."""
+        now = time.time()
+        reclaimed = 0
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT path, queue_id FROM files WHERE expires_at <= ?', (now,)
+            ).fetchall()
+            for path, queue_id in rows:
+                if queue_id in self._pinned:
+                    continue
+                freed = _remove_path(path)
+                if freed is None:
+                    continue
+                self._db.execute('DELETE FROM files WHERE path = ?', (path,))
+                self.expired_files += 1
+                reclaimed += freed
+
+            jobs = self._db.execute(
+                'SELECT queue_id, path FROM jobs WHERE expires_at <= ?', (now,)
+            ).fetchall()
+            for queue_id, path in jobs:
+                if queue_id in self._pinned:
+                    continue
+                # Catches leftovers that were never indexed, such as partial downloads
+                freed = _remove_path(path)
+                if freed is None:
+                    continue
+                self._db.execute('DELETE FROM files WHERE queue_id = ?', (queue_id,))
+                self._db.execute('DELETE FROM jobs WHERE queue_id = ?', (queue_id,))
+                reclaimed += freed
+            self.bytes_expired += reclaimed
+        if reclaimed:
+            logger.info(f"Expired downloads, reclaimed {reclaimed} bytes")
+        return reclaimed
+
+    def _evict(self):
+        """Drop least recently used files of idle jobs until the index fits its budget."""
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute('SELECT path, queue_id, size FROM files ORDER BY last_access').fetchall()
+        for path, queue_id, size in rows:
+            if total <= self.max_bytes:
+                break
+            if queue_id in self._pinned or _remove_path(path) is None:
+                continue
+            self._db.execute('DELETE FROM files WHERE path = ?', (path,))
+            total -= size
+            self.evicted_files += 1
+            self.bytes_evicted += size
+            logger.debug(f"Evicted download: {path}")
+
+    def stats(self) -> Dict:
+        """Return indexed usage against the budget and reclaim counters."""
+        with self._lock:
+            files, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files').fetchone()
+            jobs = self._db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+            return {
+                'jobs': jobs,
+                'files': files,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'expired_files': self.expired_files,
+                'evicted_files': self.evicted_files,
+                'bytes_expired': self.bytes_expired,
+                'bytes_evicted': self.bytes_evicted,
+                'bytes_reclaimed': self.bytes_expired + self.bytes_evicted,
+            }
+
+
+def _remove_path(path: str):
+    """Remove a file or directory tree; return the bytes freed, or None on failure."""
+    try:
+        if os.path.isdir(path):
+            freed = 0
+            for root, dirs, files in os.walk(path):
+                for file in files:
+                    try:
+                        freed += os.path.getsize(os.path.join(root, file))
+                    except OSError:
+                        pass
+            shutil.rmtree(path)
+            return freed
+        freed = os.path.getsize(path)
+        os.remove(path)
+        return freed
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        logger.error(f"Error removing download {path}: {str(e)}")
+        return None
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_expiry_index() -> ExpiryIndex:
+    """Return the process-wide download expiry index."""
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = ExpiryIndex()
+        return _shared_index
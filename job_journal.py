@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Set
+
+from config import JOB_JOURNAL_DB
+
+logger = logging.getLogger(__name__)
+
+
+class JobJournal:
+    """Durable record of web download jobs and the status of each of their tracks.
+
+    Backed by SQLite in WAL mode so every status change is on disk before the
+    next track starts, and a restarted process can pick unfinished jobs up
+    where they stopped.
+    """
+
+    def __init__(self, db_path: str = JOB_JOURNAL_DB):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                queue_id TEXT PRIMARY KEY,
+                spotify_url TEXT NOT NULL,
+                output_format TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                queue_id TEXT NOT NULL,
+                track_id TEXT NOT NULL,
+                artist TEXT,
+                title TEXT,
+                status TEXT NOT NULL,
+                path TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (queue_id, track_id)
+            )
+        """)
+
+    def start_job(self, queue_id: str, spotify_url: str, output_format: str):
+        """Record a job as running, keeping any tracks it finished before."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("""
+                INSERT INTO jobs VALUES (?, ?, ?, 'running', NULL, ?, ?)
+                ON CONFLICT (queue_id) DO UPDATE SET
+                    spotify_url = excluded.spotify_url,
+                    output_format = excluded.output_format,
+                    status = 'running',
+                    error = NULL,
+                    updated_at = excluded.updated_at
+            """, (queue_id, spotify_url, output_format, now, now))
+
+    def set_job_status(self, queue_id: str, status: str, error: Optional[str] = None):
+        """Update a job's status ('running', 'complete', 'failed' or 'cancelled')."""
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE queue_id = ?',
+                (status, error, time.time(), queue_id)
+            )
+
+    def add_track(self, queue_id: str, track_info: Dict):
+        """Register a track of a job as pending unless it is already known."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO tracks VALUES (?, ?, ?, ?, 'pending', NULL, NULL, ?)",
+                (queue_id, track_info['id'], track_info['artist'], track_info['title'], time.time())
+            )
+
+    def mark_track(
+        self,
+        queue_id: str,
+        track_info: Dict,
+        status: str,
+        path: Optional[str] = None,
+        error: Optional[str] = None
+    ):
+        """Record the outcome of a track ('done' or 'failed')."""
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (queue_id, track_info['id'], track_info['artist'], track_info['title'],
+                 status, path, error, time.time())
+            )
+
+    def completed_tracks(self, queue_id: str, output_format: str) -> Set[str]:
+        """Return IDs of tracks already finished in output_format whose files still exist."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT track_id, path FROM tracks WHERE queue_id = ? AND status = 'done'", (queue_id,)
+            ).fetchall()
+        return {
+            track_id for track_id, path in rows
+            if path and path.endswith(f".{output_format}") and os.path.exists(path)
+        }
+
+    def get_job(self, queue_id: str) -> Optional[Dict]:
+        """Return a job with per-status track counts, or None."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT queue_id, spotify_url, output_format, status, error, created_at, updated_at '
+                'FROM jobs WHERE queue_id = ?', (queue_id,)
+            ).fetchone()
+            if not row:
+                return None
+            counts = dict(self._db.execute(
+                'SELECT status, COUNT(*) FROM tracks WHERE queue_id = ? GROUP BY status', (queue_id,)
+            ).fetchall())
+        job = dict(zip(
+            ('queue_id', 'spotify_url', 'output_format', 'status', 'error', 'created_at', 'updated_at'), row
+        ))
+        job['tracks'] = counts
+        return job
+
+    def unfinished_jobs(self) -> List[Dict]:
+        """Return jobs that were running when the process stopped."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT queue_id, spotify_url, output_format FROM jobs WHERE status = 'running'"
+            ).fetchall()
+        return [dict(zip(('queue_id', 'spotify_url', 'output_format'), row)) for row in rows]
+
+
+_shared_journal = None
+_shared_journal_lock = threading.Lock()
+
+
+def get_job_journal() -> JobJournal:
+    """Return the process-wide job journal."""
+    global _shared_journal
+    with _shared_journal_lock:
+        if _shared_journal is None:
+            _shared_journal = JobJournal()
+        return _shared_journal
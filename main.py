@@ -2,13 +2,97 @@ import argparse
 import sys
 import os
 from typing import Optional
-from spotify_downloader import SpotifyDownloader
-from utils import parse_spotify_url
+from utils import parse_spotify_urls, create_progress_bar
 from config import SUPPORTED_FORMATS
+from metrics import get_metrics
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.opus', '.m4a', '.flac', '.ogg', '.webm', '.aac')
+
+def find_audio_files(paths, recursive: bool):
+    """Yield audio files from a list of files and directories."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path, os.path.dirname(path)
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for file in sorted(files):
+                    if file.lower().endswith(AUDIO_EXTENSIONS):
+                        yield os.path.join(root, file), path
+                if not recursive:
+                    break
+
+def convert_main(argv):
+    """Re-encode existing audio files on a process pool."""
+    parser = argparse.ArgumentParser(
+        prog='main.py convert',
+        description='Convert audio files or folders to another format'
+    )
+    parser.add_argument('paths', nargs='+', help='Audio files or directories')
+    parser.add_argument(
+        '--format',
+        choices=SUPPORTED_FORMATS,
+        required=True,
+        help='Output format'
+    )
+    parser.add_argument(
+        '--output-dir',
+        help='Output directory, mirroring the input layout (default: next to each input)',
+        default=None
+    )
+    parser.add_argument('--recursive', action='store_true', help='Descend into subdirectories')
+    parser.add_argument('--delete-original', action='store_true', help='Remove inputs after converting')
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        help='Number of conversion processes (default: one per CPU core)',
+        default=None
+    )
+    
+    args = parser.parse_args(argv)
+    # Imported after argument parsing so --help and usage errors return immediately
+    from audio_converter import AudioConverter
+    
+    jobs = []
+    for input_path, base_dir in find_audio_files(args.paths, args.recursive):
+        stem = os.path.splitext(os.path.relpath(input_path, base_dir))[0]
+        output_path = os.path.join(args.output_dir or base_dir, f"{stem}.{args.format}")
+        if os.path.abspath(output_path) == os.path.abspath(input_path):
+            continue
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        jobs.append((input_path, args.format, output_path))
+    
+    if not jobs:
+        print("No audio files to convert")
+        return
+    
+    failures = 0
+    progress_bar = create_progress_bar(len(jobs), 'Converting')
+    for result in AudioConverter.convert_batch(jobs, args.max_workers, keep_input=not args.delete_original):
+        if result['error']:
+            failures += 1
+            progress_bar.write(f"Failed: {result['input']}: {result['error']}")
+        progress_bar.update(1)
+    progress_bar.close()
+    
+    print(f"\nConverted {len(jobs) - failures} of {len(jobs)} files")
+    if failures:
+        sys.exit(1)
 
 def main():
-    parser = argparse.ArgumentParser(description='Download music from Spotify links')
-    parser.add_argument('url', help='Spotify URL (track or playlist)')
+    if sys.argv[1:2] == ['convert']:
+        convert_main(sys.argv[2:])
+        return
+    
+    parser = argparse.ArgumentParser(
+        description='Download music from Spotify links',
+        epilog='Use "main.py convert --help" to re-encode existing audio files'
+    )
+    parser.add_argument(
+        'urls',
+        nargs='+',
+        metavar='url',
+        help='Spotify URLs (track, playlist, album or artist); several may be given'
+    )
     parser.add_argument(
         '--format',
         choices=SUPPORTED_FORMATS,
@@ -23,11 +107,34 @@ def main():
     parser.add_argument(
         '--max-concurrent',
         type=int,
-        help='Maximum number of concurrent downloads (optional)',
+        help='Upper bound on concurrent downloads; the actual number adapts to '
+             'throughput and throttling (optional)',
         default=None
     )
+    parser.add_argument(
+        '--sync',
+        action='store_true',
+        help='Only download tracks missing from the output directory (tracked in a manifest)'
+    )
+    parser.add_argument(
+        '--prune',
+        action='store_true',
+        help='With --sync, delete tracks that are no longer in the source'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Bypass the persistent caches: finished tracks, Spotify metadata and the YouTube video index'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Print a per-stage timing breakdown at the end of the run'
+    )
     
     args = parser.parse_args()
+    from spotify_downloader import SpotifyDownloader
+    from sync_manifest import sync
     
     # Get credentials from environment
     client_id = os.environ.get('SPOTIFY_CLIENT_ID')
@@ -38,34 +145,54 @@ def main():
         sys.exit(1)
     
     try:
-        # Parse URL
-        content_type, content_id = parse_spotify_url(args.url)
-        if not content_type or not content_id:
+        # Parse URLs
+        try:
+            items = parse_spotify_urls(' '.join(args.urls))
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            sys.exit(1)
+        if not items:
             print("Error: Invalid Spotify URL")
             sys.exit(1)
         
         # Initialize downloader
-        downloader = SpotifyDownloader(client_id, client_secret)
+        downloader = SpotifyDownloader(client_id, client_secret, use_cache=not args.no_cache)
         
-        if content_type == 'track':
+        if args.sync:
+            summary = sync(
+                downloader,
+                items,
+                args.format,
+                args.output_dir,
+                args.max_concurrent,
+                prune=args.prune
+            )
+            if summary['unchanged']:
+                print(f"Already up to date ({summary['kept']} tracks)")
+            else:
+                print(f"Sync complete: {summary['added']} added, {summary['kept']} unchanged, "
+                      f"{summary['removed']} removed, {summary['failed']} failed")
+            
+        elif len(items) == 1 and items[0][0] == 'track':
             # Single track download
-            track_info = downloader.get_track_info(content_id)
+            track_info = downloader.get_track_info(items[0][1])
             print(f"Downloading: {track_info['artist']} - {track_info['title']}")
             
             downloader.download_track(track_info, args.format, args.output_dir)
             print("Download complete!")
             
-        else:  # playlist
-            # Get playlist tracks
-            tracks = downloader.get_playlist_tracks(content_id)
-            print(f"Found {len(tracks)} tracks in playlist")
+        else:  # playlist, album, artist or several URLs
+            # Playlists are streamed, so downloads start as soon as the first page arrives
+            total_tracks, tracks = downloader.resolve_tracks(items)
+            print(f"Found {total_tracks} tracks")
             
             # Download tracks concurrently
             successful_downloads = downloader.download_playlist_concurrent(
                 tracks,
                 args.format,
                 args.output_dir,
-                args.max_concurrent
+                args.max_concurrent,
+                total_tracks=total_tracks
             )
             
             print(f"\nSuccessfully downloaded {len(successful_downloads)} tracks!")
@@ -73,6 +200,10 @@ def main():
     except Exception as e:
         print(f"Error: {str(e)}")
         sys.exit(1)
+    finally:
+        if args.profile:
+            print("\nProfile:")
+            print(get_metrics().profile())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,182 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config import METADATA_CACHE_SIZE, METADATA_CACHE_TTL, METADATA_CACHE_DB
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache whose entries expire after a TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Any) -> Optional[Any]:
+        """Return the cached value for key without counting a lookup or refreshing its recency."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            return entry[0]
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None):
+        """Store value under key, evicting the least recently used entry if full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Any):
+        """Remove key from the cache if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class MetadataCache:
+    """Cache for Spotify track and playlist metadata.
+
+    Tracks expire after a TTL. Playlists are keyed by their snapshot_id, so a
+    cached playlist stays valid until Spotify reports a new snapshot.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = METADATA_CACHE_SIZE,
+        ttl: float = METADATA_CACHE_TTL,
+        db_path: Optional[str] = METADATA_CACHE_DB
+    ):
+        self.ttl = ttl
+        self.tracks = TTLCache(max_entries, ttl)
+        self.playlists = TTLCache(max(1, max_entries // 100), ttl)
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS tracks (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS playlists (
+                    id TEXT PRIMARY KEY,
+                    snapshot_id TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+
+    def get_track(self, track_id: str) -> Optional[Dict]:
+        """Return cached track info, or None on a miss."""
+        track = self.tracks.get(track_id)
+        if track is not None or not self._db:
+            return track
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT data, fetched_at FROM tracks WHERE id = ?', (track_id,)
+            ).fetchone()
+        if not row:
+            return None
+        remaining = self.ttl - (time.time() - row[1])
+        if remaining <= 0:
+            return None
+        track = json.loads(row[0])
+        self.tracks.set(track_id, track, ttl=remaining)
+        return track
+
+    def put_track(self, track_id: str, track: Dict):
+        """Cache track info."""
+        self.put_tracks([track])
+
+    def put_tracks(self, tracks: List[Dict]):
+        """Cache several track info dicts in one go."""
+        for track in tracks:
+            self.tracks.set(track['id'], track)
+        if self._db and tracks:
+            now = time.time()
+            with self._db_lock:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO tracks VALUES (?, ?, ?)',
+                    [(track['id'], json.dumps(track), now) for track in tracks]
+                )
+
+    def get_playlist(self, playlist_id: str, snapshot_id: str) -> Optional[List[Dict]]:
+        """Return cached playlist tracks if they match snapshot_id."""
+        entry = self.playlists.get(playlist_id)
+        if entry is None and self._db:
+            with self._db_lock:
+                row = self._db.execute(
+                    'SELECT snapshot_id, data FROM playlists WHERE id = ?', (playlist_id,)
+                ).fetchone()
+            if row:
+                entry = (row[0], json.loads(row[1]))
+                self.playlists.set(playlist_id, entry)
+        if entry is None:
+            return None
+        cached_snapshot, tracks = entry
+        if cached_snapshot != snapshot_id:
+            logger.debug(f"Playlist {playlist_id} changed ({cached_snapshot} -> {snapshot_id})")
+            return None
+        return tracks
+
+    def put_playlist(self, playlist_id: str, snapshot_id: str, tracks: List[Dict]):
+        """Cache the tracks of a playlist snapshot."""
+        self.playlists.set(playlist_id, (snapshot_id, tracks))
+        self.put_tracks(tracks)
+        if self._db:
+            with self._db_lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?)',
+                    (playlist_id, snapshot_id, json.dumps(tracks), time.time())
+                )
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_metadata_cache() -> MetadataCache:
+    """Return the process-wide metadata cache."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = MetadataCache()
+        return _shared_cache
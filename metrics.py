@@ -0,0 +1,280 @@
+import abc
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = Tuple[str, ...]
+# (metric name, operation, value, label values) as recorded by capture()
+Sample = Tuple[str, str, float, LabelValues]
+
+
+class _Metric(abc.ABC):
+    kind = ''
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help: str, labels: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def _format_labels(self, key: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    @abc.abstractmethod
+    def apply(self, operation: str, value: float, key: LabelValues):
+        """Apply one recorded operation to the series for key."""
+
+    def _record(self, operation: str, value: float, labels: Dict[str, str]):
+        key = self._key(labels)
+        self.apply(operation, value, key)
+        self.registry._captured(self.name, operation, value, key)
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. failures or bytes transferred."""
+
+    kind = 'counter'
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        self._record('inc', amount, labels)
+
+    def apply(self, operation: str, value: float, key: LabelValues):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def values(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{self._format_labels(key)} {_number(value)}" for key, value in self.values().items()]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. queue depth or busy workers."""
+
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1, **labels):
+        self._record('inc', -amount, labels)
+
+    def set(self, value: float, **labels):
+        self._record('set', value, labels)
+
+    def apply(self, operation: str, value: float, key: LabelValues):
+        if operation == 'set':
+            with self._lock:
+                self._values[key] = value
+        else:
+            super().apply(operation, value, key)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds) in cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(*args)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., count, sum, max]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        self._record('observe', value, labels)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the duration of the block, whether or not it raises."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def apply(self, operation: str, value: float, key: LabelValues):
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0, 0.0, 0.0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-3] += 1
+            series[-2] += value
+            series[-1] = max(series[-1], value)
+
+    def summaries(self) -> Dict[LabelValues, Dict[str, float]]:
+        """Return count, sum and max per label set."""
+        with self._lock:
+            return {
+                key: {'count': series[-3], 'sum': series[-2], 'max': series[-1]}
+                for key, series in self._series.items()
+            }
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            series_items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', '+Inf'))} {series[-3]}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {series[-3]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide set of metrics, rendered in the Prometheus text format.
+
+    Metrics recorded in a conversion pool worker live in that process; the
+    worker wraps its work in capture() and the parent replay()s the samples
+    so they land in the parent's registry as well.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _get_or_create(self, cls, name: str, help: str, labels: Sequence[str], **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, help, labels, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+    @contextmanager
+    def capture(self) -> Iterator[List[Sample]]:
+        """Collect the samples this thread records inside the block."""
+        samples: List[Sample] = []
+        previous = getattr(self._local, 'samples', None)
+        self._local.samples = samples
+        try:
+            yield samples
+        finally:
+            self._local.samples = previous
+
+    def _captured(self, name: str, operation: str, value: float, key: LabelValues):
+        samples = getattr(self._local, 'samples', None)
+        if samples is not None:
+            samples.append((name, operation, value, key))
+
+    def replay(self, samples: Optional[List[Sample]]):
+        """Apply samples captured in another process."""
+        for name, operation, value, key in samples or ():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.apply(operation, value, tuple(key))
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def profile(self) -> str:
+        """Return a human-readable breakdown of time, bytes and failures."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                summaries = metric.summaries()
+                if not summaries:
+                    continue
+                lines.append(f"{metric.help}:")
+                lines.append(f"  {'':28} {'count':>7} {'total s':>10} {'mean s':>9} {'max s':>9}")
+                for key, summary in sorted(summaries.items(), key=lambda item: -item[1]['sum']):
+                    label = ', '.join(key) or 'all'
+                    lines.append(
+                        f"  {label:28} {summary['count']:>7} {summary['sum']:>10.2f} "
+                        f"{summary['sum'] / summary['count']:>9.3f} {summary['max']:>9.3f}"
+                    )
+            elif metric.kind == 'counter':
+                values = {key: value for key, value in metric.values().items() if value}
+                if not values:
+                    continue
+                lines.append(f"{metric.help}:")
+                for key, value in sorted(values.items()):
+                    lines.append(f"  {', '.join(key) or 'all':28} {_number(value):>7}")
+        return '\n'.join(lines) if lines else "No metrics recorded"
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    return _registry
+
+
+# Per-track time in each download stage (spotify_page, search, download, transcode)
+STAGE_SECONDS = _registry.histogram('spotifydl_stage_seconds', 'Time per item in each stage', ('stage',))
+# Items that failed in a stage
+STAGE_FAILURES = _registry.counter('spotifydl_stage_failures_total', 'Failures per stage', ('stage',))
+# Bytes downloaded (download) and written (transcode)
+STAGE_BYTES = _registry.counter('spotifydl_stage_bytes_total', 'Bytes per stage', ('stage',))
+# Finished tracks by outcome (done, failed)
+TRACKS = _registry.counter('spotifydl_tracks_total', 'Tracks finished', ('status',))
+# Latency of each Spotify Web API call by client method
+SPOTIFY_REQUEST_SECONDS = _registry.histogram(
+    'spotifydl_spotify_request_seconds', 'Spotify API call latency', ('method',)
+)
+# Conversion time by method (remux, ffmpeg, pydub)
+CONVERSION_SECONDS = _registry.histogram(
+    'spotifydl_conversion_seconds', 'Audio conversion time', ('method',)
+)
+CONVERSION_FAILURES = _registry.counter(
+    'spotifydl_conversion_failures_total', 'Failed conversion attempts', ('method',)
+)
+# Pipeline items waiting in each stage's queue and workers busy in each stage
+QUEUE_DEPTH = _registry.gauge('spotifydl_queue_depth', 'Items queued per pipeline stage', ('stage',))
+ACTIVE_WORKERS = _registry.gauge('spotifydl_active_workers', 'Busy workers per pipeline stage', ('stage',))
+# Adaptive concurrency limit and throttle responses per upstream
+CONCURRENCY_LIMIT = _registry.gauge('spotifydl_concurrency_limit', 'Adaptive concurrency limit', ('upstream',))
+THROTTLED = _registry.counter('spotifydl_throttled_total', 'HTTP 429 responses', ('upstream',))
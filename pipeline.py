@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import ACTIVE_WORKERS, QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class Stage:
+    """A pool of worker threads draining a bounded input queue.
+
+    Each handler call receives an item and returns it (possibly updated) for
+    the next stage, or None when the item needs no further processing.
+    Putting into a full downstream queue blocks the worker, which is what
+    propagates backpressure up the pipeline.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Any], workers: int, queue_size: int):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next_stage: Optional['Stage'] = None
+        self.on_done: Callable[[Any, Optional[Exception]], None] = lambda item, error: None
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item: Any):
+        """Queue an item for this stage, blocking while the queue is full."""
+        QUEUE_DEPTH.inc(stage=self.name)
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def close(self):
+        """Stop the workers once everything queued so far has been handled."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            QUEUE_DEPTH.dec(stage=self.name)
+
+            started = time.monotonic()
+            ACTIVE_WORKERS.inc(stage=self.name)
+            try:
+                result = self.handler(item)
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+            finally:
+                ACTIVE_WORKERS.dec(stage=self.name)
+            busy = time.monotonic() - started
+
+            with self._lock:
+                self.busy_seconds += busy
+                if error:
+                    self.failed += 1
+                else:
+                    self.processed += 1
+
+            if result is not None and self.next_stage is not None:
+                blocked_since = time.monotonic()
+                try:
+                    self.next_stage.put(result)
+                except Exception as e:
+                    logger.error(f"Error passing item from stage {self.name}: {str(e)}")
+                    self._finish(result, e)
+                with self._lock:
+                    self.blocked_seconds += time.monotonic() - blocked_since
+            else:
+                self._finish(item if result is None else result, error)
+
+    def _finish(self, item: Any, error: Optional[Exception]):
+        # A failing callback must not kill the worker: a dead worker stops
+        # draining its queue, which stalls upstream stages and close()
+        try:
+            self.on_done(item, error)
+        except Exception as e:
+            logger.error(f"Error finishing item in stage {self.name}: {str(e)}")
+
+    def stats(self, elapsed: float) -> Dict:
+        """Return counters and utilization for this stage."""
+        with self._lock:
+            capacity = self.workers * elapsed
+            return {
+                'workers': self.workers,
+                'processed': self.processed,
+                'failed': self.failed,
+                'busy_seconds': round(self.busy_seconds, 3),
+                'blocked_seconds': round(self.blocked_seconds, 3),
+                'utilization': round(self.busy_seconds / capacity, 3) if capacity > 0 else 0.0,
+                'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+            }
+
+
+class Pipeline:
+    """Chain of independently sized stages connected by bounded queues."""
+
+    def __init__(
+        self,
+        stages: List[Tuple[str, Callable[[Any], Any], int]],
+        on_done: Callable[[Any, Optional[Exception]], None],
+        queue_size: int
+    ):
+        self.stages = [Stage(name, handler, workers, queue_size) for name, handler, workers in stages]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+        for stage in self.stages:
+            stage.on_done = on_done
+        self._started_at = None
+        self._finished_at = None
+
+    def start(self):
+        self._started_at = time.monotonic()
+        for stage in self.stages:
+            stage.start()
+
+    def submit(self, item: Any):
+        """Feed an item into the first stage, blocking under backpressure."""
+        self.stages[0].put(item)
+
+    def join(self):
+        """Wait for every submitted item to leave the pipeline."""
+        for stage in self.stages:
+            stage.close()
+        self._finished_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Return per-stage utilization keyed by stage name."""
+        end = self._finished_at or time.monotonic()
+        elapsed = end - self._started_at if self._started_at else 0.0
+        return {stage.name: stage.stats(elapsed) for stage in self.stages}
+
+    def log_stats(self):
+        for name, stats in self.stats().items():
+            logger.info(
+                f"Stage {name}: {stats['processed']} done, {stats['failed']} failed, "
+                f"{stats['workers']} workers at {stats['utilization']:.0%} utilization, "
+                f"{stats['blocked_seconds']}s blocked on downstream, max queue {stats['max_queue_depth']}"
+            )
@@ -0,0 +1,151 @@
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import PROGRESS_FLUSH_HZ, PROGRESS_BUFFER_SIZE
+
+
+class ProgressState:
+    """Progress channel of one job, shared by any number of subscribers.
+
+    Updates are keyed by (track ID, stage) and overwrite the previous value
+    for that key; entries of finished tracks are dropped, so memory is
+    bounded by the tracks in flight. Changed keys are published as a single
+    'progress' message at most PROGRESS_FLUSH_HZ times per second, and
+    discrete events (track finished, job complete, errors) are published as
+    they happen. Every message gets an increasing ID and the last
+    max_messages are kept in a ring buffer, so readers never consume each
+    other's messages and a reconnecting client replays from its last ID.
+    IDs are "<epoch>-<n>" with an epoch unique to the channel, so an ID
+    handed out by an earlier channel of the same job (before a restart)
+    is recognized as stale instead of being compared with this one's.
+
+    Publishing is lazy: flushes happen when a subscriber reads, so a job no
+    one is watching costs no more than a dict assignment per update.
+    Threaded readers block in read(); asynchronous readers register a
+    listener to be woken and then read with a zero timeout.
+    """
+
+    def __init__(self, max_messages: int = PROGRESS_BUFFER_SIZE, flush_hz: float = PROGRESS_FLUSH_HZ):
+        self._cond = threading.Condition()
+        self._latest: Dict[Tuple[Optional[str], str], Dict] = {}
+        self._dirty: Dict[Tuple[Optional[str], str], None] = {}
+        self._messages = deque(maxlen=max_messages)
+        self.epoch = uuid.uuid4().hex[:8]
+        self._next_id = 1
+        self._flush_interval = 1 / flush_hz
+        self._last_flush = 0.0
+        self.closed = False
+        self.closed_at: Optional[float] = None
+        self._listeners: List[Callable[[], None]] = []
+
+    def update(self, data: Dict):
+        """Replace the latest progress for data's (track_id, stage)."""
+        key = (data.get('track_id'), data['stage'])
+        with self._cond:
+            self._latest[key] = data
+            if not self._dirty:
+                # Wake readers only for the first change since the last flush
+                self._notify()
+            self._dirty[key] = None
+
+    def put(self, event: Dict):
+        """Publish a discrete event that must not be coalesced."""
+        with self._cond:
+            self._publish_event(event)
+
+    def finish_track(self, track_id: str, event: Dict):
+        """Drop a track's progress entries and publish the event reporting its outcome."""
+        with self._cond:
+            for key in [key for key in self._latest if key[0] == track_id]:
+                del self._latest[key]
+                self._dirty.pop(key, None)
+            self._publish_event(event)
+
+    def close(self):
+        """Mark the job as finished; readers stop once they have caught up."""
+        with self._cond:
+            self._flush()
+            self.closed = True
+            self.closed_at = time.time()
+            self._notify()
+
+    def add_listener(self, listener: Callable[[], None]):
+        """Call listener (from the publishing thread) whenever there is something to read."""
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def snapshot(self) -> List[Dict]:
+        """Return the latest progress of every key."""
+        with self._cond:
+            return list(self._latest.values())
+
+    def read(self, last_id: Optional[str], timeout: float) -> Tuple[List[Tuple[Optional[str], Dict]], bool]:
+        """Wait up to timeout for messages after last_id and return (messages, closed).
+
+        messages is a list of (ID, message). A reader whose last_id has
+        already left the ring buffer first gets a snapshot of the current
+        progress (with no ID) before the buffered messages; so does a reader
+        with a stale ID (another epoch, or one this channel never issued),
+        which then gets the whole buffer. closed is True once the job has
+        finished and the reader has seen every message.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            position, stale = self._position(last_id)
+            while True:
+                now = time.monotonic()
+                if self._dirty and now - self._last_flush >= self._flush_interval:
+                    self._flush()
+                messages = [(message_id, data) for message_id, data in self._messages
+                            if position is None or message_id > position]
+                if messages or self.closed or now >= deadline:
+                    break
+                wait = deadline - now
+                if self._dirty:
+                    wait = min(wait, self._last_flush + self._flush_interval - now)
+                self._cond.wait(max(wait, 0.001))
+
+            seen_id = messages[-1][0] if messages else position
+            closed = self.closed and (seen_id or 0) >= self._next_id - 1
+            messages = [(f"{self.epoch}-{message_id}", data) for message_id, data in messages]
+            if stale or (position is not None and self._messages and self._messages[0][0] > position + 1):
+                messages.insert(0, (None, {'type': 'progress', 'updates': list(self._latest.values())}))
+            return messages, closed
+
+    def _position(self, last_id: Optional[str]) -> Tuple[Optional[int], bool]:
+        """Return (message number to read after, stale) for a reader's last event ID."""
+        if last_id is None:
+            return None, False
+        epoch, _, number = last_id.partition('-')
+        if epoch != self.epoch or not number.isdigit() or int(number) >= self._next_id:
+            return 0, True
+        return int(number), False
+
+    def _flush(self):
+        if self._dirty:
+            self._append({'type': 'progress', 'updates': [self._latest[key] for key in self._dirty]})
+            self._dirty.clear()
+        self._last_flush = time.monotonic()
+
+    def _publish_event(self, event: Dict):
+        # Pending updates go out first so subscribers see events in order
+        self._flush()
+        self._append(event)
+        self._notify()
+
+    def _notify(self):
+        self._cond.notify_all()
+        for listener in self._listeners:
+            listener()
+
+    def _append(self, message: Dict):
+        self._messages.append((self._next_id, message))
+        self._next_id += 1
@@ -0,0 +1,151 @@
+import sys
+import threading
+import itertools
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from config import SCHEDULER_MAX_SLOTS, SCHEDULER_MAX_JOBS
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerFull(Exception):
+    """Raised when a job is refused because the scheduler queue is full."""
+
+    def __init__(self, queue_position: int):
+        super().__init__(f"Download queue is full ({queue_position - 1} jobs ahead)")
+        self.queue_position = queue_position
+
+
+class JobScheduler:
+    """Process-wide cap on concurrent download work, shared fairly between jobs.
+
+    Every search or download operation of a job holds one of max_slots slots.
+    When a slot frees up it goes to the waiting job holding the fewest slots,
+    then to the job with the fewest tracks left (shortest job first), then to
+    the longest waiter, so single tracks overtake bulk playlist jobs instead
+    of queueing behind them. At most max_jobs jobs are admitted at once.
+    """
+
+    def __init__(self, max_slots: int = SCHEDULER_MAX_SLOTS, max_jobs: int = SCHEDULER_MAX_JOBS):
+        self.max_slots = max(1, max_slots)
+        self.max_jobs = max(1, max_jobs)
+        self._cond = threading.Condition()
+        self._jobs: Dict[str, Dict] = {}
+        self._waiters: Dict[int, str] = {}
+        self._seq = itertools.count()
+        self._in_use = 0
+
+    def register(self, job_id: str, total_tracks: Optional[int] = None, force: bool = False) -> int:
+        """Admit a job and return its queue position (1 when it is first in line).
+
+        Jobs of unknown size rank behind every job of known size until
+        set_total is called. Raises SchedulerFull unless force is set or
+        there is room for the job.
+        """
+        with self._cond:
+            if job_id not in self._jobs:
+                if len(self._jobs) >= self.max_jobs and not force:
+                    raise SchedulerFull(len(self._jobs) + 1)
+                self._jobs[job_id] = {
+                    'seq': next(self._seq),
+                    'active': 0,
+                    'remaining': sys.maxsize if total_tracks is None else total_tracks
+                }
+            return self._position(job_id)
+
+    def set_total(self, job_id: str, total_tracks: int):
+        """Record how many tracks a job has left once its size is known."""
+        with self._cond:
+            if job_id in self._jobs:
+                self._jobs[job_id]['remaining'] = total_tracks
+
+    def track_done(self, job_id: str):
+        """Count one of a job's tracks as finished."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job and job['remaining'] > 0:
+                job['remaining'] -= 1
+
+    def unregister(self, job_id: str):
+        """Remove a finished or cancelled job."""
+        with self._cond:
+            self._jobs.pop(job_id, None)
+            self._cond.notify_all()
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Return how many admitted jobs rank at or ahead of job_id, or None if unknown."""
+        with self._cond:
+            return self._position(job_id) if job_id in self._jobs else None
+
+    @contextmanager
+    def slot(self, job_id: str) -> Iterator[None]:
+        """Hold one global slot on behalf of job_id for the duration of the block."""
+        ticket = next(self._seq)
+        with self._cond:
+            self._waiters[ticket] = job_id
+            try:
+                while self._in_use >= self.max_slots or self._next_ticket() != ticket:
+                    self._cond.wait()
+            finally:
+                del self._waiters[ticket]
+            self._in_use += 1
+            job = self._jobs.get(job_id)
+            if job:
+                job['active'] += 1
+            # Another slot may still be free for the next waiter
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_use -= 1
+                job = self._jobs.get(job_id)
+                if job:
+                    job['active'] -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        """Return slot usage and per-job state."""
+        with self._cond:
+            return {
+                'max_slots': self.max_slots,
+                'slots_in_use': self._in_use,
+                'waiting': len(self._waiters),
+                'jobs': {
+                    job_id: {'active': job['active'], 'remaining': job['remaining'],
+                             'position': self._position(job_id)}
+                    for job_id, job in self._jobs.items()
+                },
+            }
+
+    def _rank(self, job_id: str, ticket: int):
+        job = self._jobs.get(job_id)
+        if not job:
+            return (0, 0, ticket)
+        return (job['active'], job['remaining'], ticket)
+
+    def _next_ticket(self) -> int:
+        return min(self._waiters, key=lambda ticket: self._rank(self._waiters[ticket], ticket))
+
+    def _position(self, job_id: str) -> int:
+        job = self._jobs[job_id]
+        key = (job['remaining'], job['seq'])
+        return 1 + sum(
+            1 for other_id, other in self._jobs.items()
+            if other_id != job_id and (other['remaining'], other['seq']) < key
+        )
+
+
+_shared_scheduler = None
+_shared_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> JobScheduler:
+    """Return the process-wide job scheduler."""
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = JobScheduler()
+        return _shared_scheduler
@@ -0,0 +1,101 @@
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from config import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_PREFETCH_WORKERS
+from metadata_cache import TTLCache
+from concurrency import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SearchFetch = Callable[[str, int, int], Optional[Dict]]
+
+
+def search_key(query: str, offset: int, limit: int) -> Tuple[str, int, int]:
+    """Normalize a search so equivalent queries share a cache entry."""
+    return ' '.join(query.lower().split()), offset, limit
+
+
+class SearchCache:
+    """Cache of Spotify search result pages.
+
+    Pages are kept in a TTL/LRU cache keyed by the normalized (query,
+    offset, limit). Concurrent misses for the same page share one upstream
+    call, and serving a page prefetches the next one in the background, so
+    "load more" is usually answered from the cache.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.pages = TTLCache(max_entries, ttl)
+        self._flight = SingleFlight()
+        self._prefetcher = ThreadPoolExecutor(max_workers=SEARCH_PREFETCH_WORKERS, thread_name_prefix='search-prefetch')
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.prefetched = 0
+
+    def search(self, query: str, offset: int, limit: int, fetch: SearchFetch) -> Optional[Dict]:
+        """Return the page for (query, offset, limit), calling fetch on a miss.
+
+        fetch receives the original query, offset and limit and returns a
+        page dict with a 'total' count, or None when there are no results
+        (which is not cached).
+        """
+        key = search_key(query, offset, limit)
+        page = self.pages.get(key)
+        if page is None:
+            page, shared = self._flight.do(key, lambda: self._fetch(key, query, offset, limit, fetch))
+            if shared:
+                with self._lock:
+                    self.coalesced += 1
+        if page is not None and offset + limit < page.get('total', 0):
+            self._prefetch(query, offset + limit, limit, fetch)
+        return page
+
+    def _fetch(self, key: Tuple[str, int, int], query: str, offset: int, limit: int,
+               fetch: SearchFetch) -> Optional[Dict]:
+        page = fetch(query, offset, limit)
+        if page is not None:
+            self.pages.set(key, page)
+        return page
+
+    def _prefetch(self, query: str, offset: int, limit: int, fetch: SearchFetch):
+        key = search_key(query, offset, limit)
+        if self._flight.in_flight(key) or self.pages.peek(key) is not None:
+            return
+
+        def run():
+            try:
+                self._flight.do(key, lambda: self._fetch(key, query, offset, limit, fetch))
+            except Exception as e:
+                logger.debug(f"Search prefetch failed: {str(e)}")
+
+        with self._lock:
+            self.prefetched += 1
+        self._prefetcher.submit(run)
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and the hit rate."""
+        hits, misses = self.pages.hits, self.pages.misses
+        lookups = hits + misses
+        return {
+            'entries': len(self.pages),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            'coalesced': self.coalesced,
+            'prefetched': self.prefetched,
+        }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Return the process-wide search cache."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SearchCache()
+        return _shared_cache
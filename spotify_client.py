@@ -0,0 +1,124 @@
+import time
+import threading
+import logging
+from typing import Callable, Dict, Tuple
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import MemoryCacheHandler
+from spotipy.oauth2 import SpotifyClientCredentials
+
+from config import (
+    SPOTIFY_API_URL, SPOTIFY_TOKEN_URL,
+    SPOTIFY_HTTP_POOL_SIZE, SPOTIFY_TOKEN_REFRESH_MARGIN, SPOTIFY_REQUEST_TIMEOUT, THROTTLE_MAX_RETRIES
+)
+from concurrency import AdaptiveLimiter, throttle_info
+from metrics import SPOTIFY_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class SharedClientCredentials(SpotifyClientCredentials):
+    """Client credentials flow whose token is shared by every thread.
+
+    The token lives in memory, is fetched by one thread at a time and is
+    renewed SPOTIFY_TOKEN_REFRESH_MARGIN seconds before it expires, so
+    concurrent requests never stampede the token endpoint or race an
+    expiring token.
+    """
+
+    OAUTH_TOKEN_URL = SPOTIFY_TOKEN_URL
+
+    def __init__(self, client_id: str, client_secret: str, session: requests.Session):
+        super().__init__(
+            client_id=client_id,
+            client_secret=client_secret,
+            requests_session=session,
+            requests_timeout=SPOTIFY_REQUEST_TIMEOUT,
+            cache_handler=MemoryCacheHandler()
+        )
+        self._token_lock = threading.Lock()
+
+    def get_access_token(self, as_dict: bool = False, check_cache: bool = True):
+        with self._token_lock:
+            token_info = self.cache_handler.get_cached_token() if check_cache else None
+            if not token_info or token_info['expires_at'] - time.time() < SPOTIFY_TOKEN_REFRESH_MARGIN:
+                token_info = self._add_custom_values_to_token_info(self._request_access_token())
+                self.cache_handler.save_token_to_cache(token_info)
+                logger.debug("Fetched a new Spotify access token")
+        return token_info if as_dict else token_info['access_token']
+
+
+def create_session(pool_size: int = SPOTIFY_HTTP_POOL_SIZE) -> requests.Session:
+    """Return a keep-alive session whose connection pool fits pool_size concurrent requests.
+
+    No retry policy is mounted: every caller goes through limited_call,
+    which handles throttling and retries with the adaptive limiter.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def limited_call(limiter: AdaptiveLimiter, func: Callable, *args, **kwargs):
+    """Call the Spotify API within the adaptive limit, retrying throttled and failed calls.
+
+    A 429 backs the limiter off and waits out its Retry-After; 5xx and
+    connection errors shrink the limit and are retried with exponential
+    backoff; other API errors are raised at once.
+    """
+    for attempt in range(THROTTLE_MAX_RETRIES + 1):
+        throttled = False
+        with limiter.slot():
+            try:
+                with SPOTIFY_REQUEST_SECONDS.time(method=func.__name__):
+                    result = func(*args, **kwargs)
+                limiter.on_success()
+                return result
+            except spotipy.SpotifyException as e:
+                throttled, retry_after = throttle_info(e)
+                if throttled:
+                    limiter.on_throttle(retry_after)
+                elif e.http_status >= 500:
+                    limiter.on_error()
+                else:
+                    raise
+                error = e
+            except requests.exceptions.RequestException as e:
+                limiter.on_error()
+                error = e
+        if attempt == THROTTLE_MAX_RETRIES:
+            raise error
+        logger.warning(f"Spotify API call failed ({str(error)}), retrying")
+        if not throttled:
+            time.sleep(0.5 * 2 ** attempt)
+
+
+_shared_clients: Dict[Tuple[str, str], spotipy.Spotify] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def get_spotify_client(client_id: str, client_secret: str) -> spotipy.Spotify:
+    """Return the process-wide Spotify client for these credentials.
+
+    The client shares one pooled HTTP session and one access token between
+    all threads; spotipy keeps no per-request state on it, so it is safe to
+    use concurrently.
+    """
+    if not client_id or not client_secret:
+        raise ValueError("Spotify credentials are required")
+    key = (client_id, client_secret)
+    with _shared_clients_lock:
+        if key not in _shared_clients:
+            session = create_session()
+            client = spotipy.Spotify(
+                auth_manager=SharedClientCredentials(client_id, client_secret, session),
+                requests_session=session,
+                requests_timeout=SPOTIFY_REQUEST_TIMEOUT
+            )
+            client.prefix = SPOTIFY_API_URL
+            _shared_clients[key] = client
+        return _shared_clients[key]
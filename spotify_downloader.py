@@ -1,51 +1,102 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-import yt_dlp
 import os
-from typing import List, Dict, Optional
+import time
+from typing import TYPE_CHECKING, Callable, List, Dict, Optional, Iterable, Iterator, Tuple
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from config import DOWNLOAD_DIR, YTDLP_OPTIONS, FILENAME_TEMPLATE, MAX_CONCURRENT_DOWNLOADS
-from utils import create_progress_bar, sanitize_filename
-from audio_converter import AudioConverter
-import queue
+from config import (
+    DOWNLOAD_DIR, YTDLP_OPTIONS, FILENAME_TEMPLATE, MAX_CONCURRENT_DOWNLOADS, AUDIO_QUALITY,
+    PLAYLIST_PAGE_SIZE, PLAYLIST_PAGE_WORKERS, PLAYLIST_FIELDS,
+    SPOTIFY_TRACKS_BATCH_SIZE, SPOTIFY_ALBUMS_BATCH_SIZE,
+    PIPELINE_SEARCH_WORKERS, PIPELINE_TRANSCODE_WORKERS, PIPELINE_QUEUE_SIZE,
+    PREFERRED_SOURCE_FORMATS, THROTTLE_MAX_RETRIES, DOWNLOAD_CONCURRENCY_MAX
+)
+from utils import create_progress_bar, link_or_copy, sanitize_filename
+from audio_converter import AudioConverter, convert_in_worker, run_in_conversion_pool
+from track_cache import TrackCache, get_track_cache
+from metadata_cache import MetadataCache, get_metadata_cache
+from youtube_index import YouTubeIndex, get_youtube_index, video_entry
+from pipeline import Pipeline
+from scheduler import JobScheduler
+from progress import ProgressState
+from concurrency import AdaptiveLimiter, SingleFlight, get_limiter, is_upstream_error, throttle_info
+from metrics import STAGE_BYTES, STAGE_FAILURES, STAGE_SECONDS, TRACKS, get_metrics
 import threading
 import logging
 
+if TYPE_CHECKING:
+    import yt_dlp
+
 logger = logging.getLogger(__name__)
 
+# In-flight track downloads keyed by (track ID, format), shared by every downloader in the process
+_track_flights = SingleFlight()
+
 class SpotifyDownloader:
-    def __init__(self, client_id: str, client_secret: str, progress_queue: Optional[queue.Queue] = None):
-        """Initialize Spotify client."""
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        progress: Optional[ProgressState] = None,
+        track_cache: Optional[TrackCache] = None,
+        metadata_cache: Optional[MetadataCache] = None,
+        youtube_index: Optional[YouTubeIndex] = None,
+        use_cache: bool = True,
+        scheduler: Optional[JobScheduler] = None,
+        job_id: Optional[str] = None,
+        spotify_limiter: Optional[AdaptiveLimiter] = None,
+        download_limiter: Optional[AdaptiveLimiter] = None
+    ):
+        """Initialize Spotify client.
+
+        With a scheduler, every search and download runs in one of its global
+        slots on behalf of job_id. Spotify API calls and media downloads are
+        throttled by separate adaptive limiters (process-wide by default).
+        """
         if not client_id or not client_secret:
             raise ValueError("Spotify credentials are required")
             
-        self.spotify = spotipy.Spotify(
-            client_credentials_manager=SpotifyClientCredentials(
-                client_id=client_id,
-                client_secret=client_secret
-            )
-        )
-        self.ydl = yt_dlp.YoutubeDL(YTDLP_OPTIONS)
-        self.progress_queue = progress_queue
-        self._active_downloads = set()
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self._spotify = None
+        self.progress = progress
+        self.track_cache = (track_cache or get_track_cache()) if use_cache else None
+        self.metadata_cache = (metadata_cache or get_metadata_cache()) if use_cache else None
+        self.youtube_index = (youtube_index or get_youtube_index()) if use_cache else None
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.spotify_limiter = spotify_limiter or get_limiter('spotify')
+        self.download_limiter = download_limiter or get_limiter('youtube')
+        self.pipeline_stats = {}
+        self.pcm_bytes_avoided = 0
         self._lock = threading.Lock()
         
-    def _check_active_download(self, track_id: str) -> bool:
-        """Check if a track is already being downloaded."""
-        with self._lock:
-            if track_id in self._active_downloads:
-                return True
-            self._active_downloads.add(track_id)
-            return False
-            
-    def _remove_active_download(self, track_id: str):
-        """Remove a track from active downloads."""
-        with self._lock:
-            self._active_downloads.discard(track_id)
-    
-    def emit_progress(self, stage: str, current: int, total: int, message: str = "", extra: dict = None):
-        """Emit progress event through queue if available."""
-        if self.progress_queue:
+    @property
+    def spotify(self):
+        """The shared Spotify client, created (and spotipy imported) on first use.
+
+        The shared client has no urllib3 retry policy, so 429s and their
+        Retry-After reach _spotify_call instead of being slept on silently.
+        """
+        if self._spotify is None:
+            from spotify_client import get_spotify_client
+            self._spotify = get_spotify_client(self.client_id, self.client_secret)
+        return self._spotify
+
+    def emit_progress(
+        self,
+        stage: str,
+        current: int,
+        total: int,
+        message: str = "",
+        extra: dict = None,
+        track: Optional[Dict] = None
+    ):
+        """Record progress of a stage, of the given track or of the whole job.
+
+        Updates are coalesced per (track, stage) by the progress state, so
+        emitting on every yt-dlp chunk is cheap.
+        """
+        if self.progress:
             data = {
                 'stage': stage,
                 'current': current,
@@ -53,56 +104,532 @@ class SpotifyDownloader:
                 'percentage': (current / total * 100) if total > 0 else 0,
                 'message': message
             }
+            if track:
+                data['track_id'] = track['id']
+                data['track_name'] = f"{track['artist']} - {track['title']}"
             if extra:
                 data.update(extra)
-            self.progress_queue.put(data)
+            self.progress.update(data)
+
+    def emit_track_done(self, track: Dict, error: Optional[str] = None):
+        """Report that a track finished, replacing its per-stage progress."""
+        if self.progress:
+            self.progress.finish_track(track['id'], {
+                'type': 'track',
+                'track_id': track['id'],
+                'track_name': f"{track['artist']} - {track['title']}",
+                'status': 'failed' if error else 'done',
+                'error': error
+            })
+
+    def _spotify_call(self, func: Callable, *args, **kwargs):
+        """Call the Spotify API within the adaptive limit, retrying throttled and failed calls."""
+        from spotify_client import limited_call
+        return limited_call(self.spotify_limiter, func, *args, **kwargs)
 
     def get_track_info(self, track_id: str) -> Dict:
         """Get track information from Spotify."""
+        if self.metadata_cache:
+            cached = self.metadata_cache.get_track(track_id)
+            if cached is not None:
+                return cached
         try:
-            track = self.spotify.track(track_id)
-            return {
+            track = self._spotify_call(self.spotify.track, track_id)
+            track_info = {
                 'title': track['name'],
                 'artist': track['artists'][0]['name'],
                 'album': track['album']['name'],
                 'id': track_id
             }
+            if self.metadata_cache:
+                self.metadata_cache.put_track(track_id, track_info)
+            return track_info
         except Exception as e:
             logger.error(f"Failed to get track info: {str(e)}")
             raise Exception(f"Failed to get track info: {str(e)}")
 
+    def get_tracks_info(self, track_ids: List[str]) -> List[Dict]:
+        """Get information for many tracks using the batch tracks endpoint."""
+        found = {}
+        missing = []
+        for track_id in dict.fromkeys(track_ids):
+            cached = self.metadata_cache.get_track(track_id) if self.metadata_cache else None
+            if cached is not None:
+                found[track_id] = cached
+            else:
+                missing.append(track_id)
+        
+        try:
+            for start in range(0, len(missing), SPOTIFY_TRACKS_BATCH_SIZE):
+                batch = missing[start:start + SPOTIFY_TRACKS_BATCH_SIZE]
+                fetched = []
+                for track in self._spotify_call(self.spotify.tracks, batch)['tracks']:
+                    if not track:  # Unknown IDs come back as null
+                        continue
+                    track_info = {
+                        'title': track['name'],
+                        'artist': track['artists'][0]['name'],
+                        'album': track['album']['name'],
+                        'id': track['id']
+                    }
+                    found[track['id']] = track_info
+                    fetched.append(track_info)
+                if self.metadata_cache:
+                    self.metadata_cache.put_tracks(fetched)
+        except Exception as e:
+            logger.error(f"Failed to get track info: {str(e)}")
+            raise Exception(f"Failed to get track info: {str(e)}")
+        
+        return [found[track_id] for track_id in dict.fromkeys(track_ids) if track_id in found]
+
+    def get_albums_tracks(self, album_ids: List[str]) -> List[Dict]:
+        """Get the tracks of many albums using the batch albums endpoint."""
+        tracks = []
+        try:
+            for start in range(0, len(album_ids), SPOTIFY_ALBUMS_BATCH_SIZE):
+                batch = album_ids[start:start + SPOTIFY_ALBUMS_BATCH_SIZE]
+                for album in self._spotify_call(self.spotify.albums, batch)['albums']:
+                    if not album:
+                        continue
+                    page = album['tracks']
+                    while page:
+                        for track in page['items']:
+                            if track and track.get('id'):
+                                tracks.append({
+                                    'title': track['name'],
+                                    'artist': track['artists'][0]['name'],
+                                    'album': album['name'],
+                                    'id': track['id']
+                                })
+                        # Albums with more than 50 tracks are paginated
+                        page = self._spotify_call(self.spotify.next, page) if page['next'] else None
+        except Exception as e:
+            logger.error(f"Failed to get album tracks: {str(e)}")
+            raise Exception(f"Failed to get album tracks: {str(e)}")
+        
+        if self.metadata_cache:
+            self.metadata_cache.put_tracks(tracks)
+        return tracks
+
+    def get_artist_top_tracks(self, artist_id: str) -> List[Dict]:
+        """Get an artist's top tracks."""
+        try:
+            results = self._spotify_call(self.spotify.artist_top_tracks, artist_id)
+            tracks = [
+                {
+                    'title': track['name'],
+                    'artist': track['artists'][0]['name'],
+                    'album': track['album']['name'],
+                    'id': track['id']
+                }
+                for track in results['tracks'] if track and track.get('id')
+            ]
+        except Exception as e:
+            logger.error(f"Failed to get artist top tracks: {str(e)}")
+            raise Exception(f"Failed to get artist top tracks: {str(e)}")
+        
+        if self.metadata_cache:
+            self.metadata_cache.put_tracks(tracks)
+        return tracks
+
+    def resolve_tracks(self, items: List[Tuple[str, str]]) -> Tuple[int, Iterable[Dict]]:
+        """Resolve (type, ID) pairs from parse_spotify_urls into tracks.
+
+        Returns the number of tracks and an iterable over them. A lone playlist
+        is streamed; otherwise IDs are grouped by type and resolved through the
+        batch endpoints, and duplicate tracks are dropped.
+        """
+        if len(items) == 1 and items[0][0] == 'playlist':
+            return self.stream_playlist_tracks(items[0][1])
+        
+        track_ids = [content_id for content_type, content_id in items if content_type == 'track']
+        album_ids = [content_id for content_type, content_id in items if content_type == 'album']
+        
+        tracks = []
+        tracks.extend(self.get_tracks_info(track_ids) if track_ids else [])
+        tracks.extend(self.get_albums_tracks(album_ids) if album_ids else [])
+        for content_type, content_id in items:
+            if content_type == 'artist':
+                tracks.extend(self.get_artist_top_tracks(content_id))
+            elif content_type == 'playlist':
+                tracks.extend(self.get_playlist_tracks(content_id))
+        
+        unique_tracks = list({track['id']: track for track in tracks}.values())
+        return len(unique_tracks), unique_tracks
+
     def get_playlist_tracks(self, playlist_id: str) -> List[Dict]:
         """Get all tracks from a playlist."""
+        _, tracks = self.stream_playlist_tracks(playlist_id)
+        return list(tracks)
+
+    def get_playlist_snapshot(self, playlist_id: str) -> str:
+        """Return the playlist's current snapshot_id, which changes on every edit."""
         try:
-            results = self.spotify.playlist_tracks(playlist_id)
-            tracks = []
-            total_tracks = results['total']
-            
-            self.emit_progress('fetching_playlist', 0, total_tracks, "Fetching playlist tracks")
-            tracks_fetched = 0
+            return self._spotify_call(self.spotify.playlist, playlist_id, fields='snapshot_id')['snapshot_id']
+        except Exception as e:
+            logger.error(f"Failed to get playlist: {str(e)}")
+            raise Exception(f"Failed to get playlist: {str(e)}")
+
+    def stream_playlist_tracks(self, playlist_id: str) -> Tuple[int, Iterator[Dict]]:
+        """Return the playlist size and an iterator over its tracks.
+
+        The first page is fetched eagerly to learn the total; the remaining
+        pages are requested concurrently by offset and yielded in playlist
+        order as soon as each one arrives.
+        """
+        try:
+            snapshot_id = None
+            if self.metadata_cache:
+                # A cheap snapshot lookup tells us whether the cached track list is still current
+                snapshot_id = self.get_playlist_snapshot(playlist_id)
+                cached = self.metadata_cache.get_playlist(playlist_id, snapshot_id)
+                if cached is not None:
+                    self.emit_progress('fetching_playlist', len(cached), len(cached),
+                                   "Loaded playlist from cache")
+                    return len(cached), iter(cached)
             
-            while results:
-                for item in results['items']:
-                    if item['track']:  # Check if track exists
-                        track = item['track']
-                        tracks.append({
-                            'title': track['name'],
-                            'artist': track['artists'][0]['name'],
-                            'album': track['album']['name'],
-                            'id': track['id']
-                        })
-                        tracks_fetched += 1
-                        self.emit_progress('fetching_playlist', tracks_fetched, total_tracks)
+            first_page = self._fetch_playlist_page(playlist_id, 0)
+        except Exception as e:
+            logger.error(f"Failed to get playlist: {str(e)}")
+            raise Exception(f"Failed to get playlist: {str(e)}")
+        
+        total_tracks = first_page['total']
+        self.emit_progress('fetching_playlist', 0, total_tracks, "Fetching playlist tracks")
+        return total_tracks, self._iter_playlist_pages(playlist_id, snapshot_id, first_page, total_tracks)
+
+    def _fetch_playlist_page(self, playlist_id: str, offset: int) -> Dict:
+        """Fetch one page of playlist items, trimmed to the fields we use."""
+        with STAGE_SECONDS.time(stage='spotify_page'):
+            return self._spotify_call(
+                self.spotify.playlist_items,
+                playlist_id,
+                fields=PLAYLIST_FIELDS,
+                limit=PLAYLIST_PAGE_SIZE,
+                offset=offset,
+                additional_types=('track',)
+            )
+
+    def _iter_playlist_pages(
+        self,
+        playlist_id: str,
+        snapshot_id: Optional[str],
+        first_page: Dict,
+        total_tracks: int
+    ) -> Iterator[Dict]:
+        """Yield tracks page by page while later pages are fetched in the background."""
+        offsets = iter(range(PLAYLIST_PAGE_SIZE, total_tracks, PLAYLIST_PAGE_SIZE))
+        pending = deque()
+        tracks = [] if self.metadata_cache else None
+        tracks_fetched = 0
+        executor = ThreadPoolExecutor(max_workers=PLAYLIST_PAGE_WORKERS)
+        
+        def fill_window():
+            # Keep a bounded number of page requests in flight
+            while len(pending) < PLAYLIST_PAGE_WORKERS * 2:
+                offset = next(offsets, None)
+                if offset is None:
+                    return
+                pending.append(executor.submit(self._fetch_playlist_page, playlist_id, offset))
+        
+        try:
+            fill_window()
+            page = first_page
+            while page is not None:
+                for item in page['items']:
+                    track = item.get('track')
+                    if not track or not track.get('id'):  # Skip removed and local tracks
+                        continue
+                    track_info = {
+                        'title': track['name'],
+                        'artist': track['artists'][0]['name'],
+                        'album': track['album']['name'],
+                        'id': track['id']
+                    }
+                    if tracks is not None:
+                        tracks.append(track_info)
+                    yield track_info
+                tracks_fetched += len(page['items'])
+                self.emit_progress('fetching_playlist', min(tracks_fetched, total_tracks), total_tracks)
                 
-                if results['next']:
-                    results = self.spotify.next(results)
+                if pending:
+                    page = pending.popleft().result()
+                    fill_window()
                 else:
-                    results = None
+                    page = None
             
-            return tracks
+            if tracks is not None:
+                self.metadata_cache.put_playlist(playlist_id, snapshot_id, tracks)
         except Exception as e:
             logger.error(f"Failed to get playlist: {str(e)}")
             raise Exception(f"Failed to get playlist: {str(e)}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _search_query(track_info: Dict) -> str:
+        """Build the YouTube search query for a track."""
+        return f"{track_info['artist']} - {track_info['title']} audio"
+
+    def _search_youtube(self, ydl: 'yt_dlp.YoutubeDL', track_info: Dict, download: bool) -> Dict:
+        """Search YouTube for a track, record the result in the index and return its info."""
+        info = ydl.extract_info(f"ytsearch1:{self._search_query(track_info)}", download=download)
+        entries = info.get('entries') if info else None
+        if entries is not None:
+            entries = [entry for entry in entries if entry]
+            if not entries:
+                raise Exception("No YouTube results found")
+            info = entries[0]
+        if self.youtube_index:
+            self.youtube_index.put_info(track_info['id'], info)
+        return info
+
+    def _resolve_video(self, track_info: Dict) -> Tuple[Dict, Optional[Dict]]:
+        """Return the index entry for a track's video and, after a fresh search, its info dict."""
+        if self.youtube_index:
+            video = self.youtube_index.get(track_info['id'])
+            if video:
+                return video, None
+        
+        # yt-dlp is only imported once a track actually needs a search
+        from ydl_pool import get_ydl_pool
+        with get_ydl_pool('resolve').get() as ydl:
+            info = self._search_youtube(ydl, track_info, download=False)
+        return video_entry(info), info
+
+    def resolve_youtube(self, track_info: Dict) -> Dict:
+        """Return the YouTube video for a track, searching only on an index miss."""
+        video, _ = self._resolve_video(track_info)
+        return video
+
+    def warm_youtube_index(self, tracks: Iterable[Dict], max_workers: Optional[int] = None) -> int:
+        """Resolve tracks into the YouTube index without downloading them."""
+        if not max_workers:
+            max_workers = MAX_CONCURRENT_DOWNLOADS
+        
+        resolved = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.resolve_youtube, track): track for track in tracks}
+            for future in as_completed(futures):
+                track = futures[future]
+                try:
+                    future.result()
+                    resolved += 1
+                except Exception as e:
+                    logger.error(f"Failed to resolve {track['artist']} - {track['title']}: {str(e)}")
+        return resolved
+
+    @staticmethod
+    def output_path_for(track_info: Dict, output_format: str, output_dir: Optional[str] = None) -> str:
+        """Return the path download_track writes a track to."""
+        filename = sanitize_filename(
+            FILENAME_TEMPLATE.format(
+                artist=track_info['artist'],
+                title=track_info['title']
+            )
+        )
+        return os.path.join(output_dir or DOWNLOAD_DIR, f"{filename}.{output_format}")
+
+    def _prepare_job(self, track_info: Dict, output_format: str, output_dir: Optional[str]) -> Dict:
+        """Build the work item passed between the search, download and transcode stages."""
+        output_path = self.output_path_for(track_info, output_format, output_dir)
+        output_dir = os.path.dirname(output_path)
+        os.makedirs(output_dir, exist_ok=True)
+        return {
+            'track': track_info,
+            'format': output_format,
+            'output_dir': output_dir,
+            'filename': os.path.splitext(os.path.basename(output_path))[0],
+            'output_path': output_path,
+            'video': None,
+            'info': None,
+            'source_path': None,
+            'duration': None,
+            'acodec': None
+        }
+
+    def _search_stage(self, job: Dict) -> Optional[Dict]:
+        """Serve the job from the track cache or resolve its YouTube video."""
+        track_info = job['track']
+        if self.track_cache and self.track_cache.materialize(
+            track_info['id'], job['format'], AUDIO_QUALITY, job['output_path']
+        ):
+            self.emit_progress('downloading', 100, 100,
+                           f"Loaded from cache: {track_info['artist']} - {track_info['title']}",
+                           track=track_info)
+            return None
+        
+        job['video'], job['info'] = self._resolve_video(track_info)
+        return job
+
+    def _download_stage(self, job: Dict) -> Dict:
+        """Download the source audio stream of the resolved video."""
+        track_info = job['track']
+        video = job['video']
+        
+        # Per-track download settings, applied to a pooled YoutubeDL checked out for the call
+        download_opts = {}
+        download_opts['outtmpl'] = os.path.join(job['output_dir'], job['filename'] + '.source.%(ext)s')
+        # Prefer a source codec that can be remuxed into the target, then the indexed format
+        download_opts['format'] = '/'.join(filter(None, [
+            PREFERRED_SOURCE_FORMATS.get(job['format']),
+            video.get('format_id'),
+            YTDLP_OPTIONS['format']
+        ]))
+        
+        def progress_hook(d):
+            if d['status'] == 'downloading':
+                total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
+                if total_bytes:
+                    downloaded = d.get('downloaded_bytes', 0)
+                    self.emit_progress('downloading', downloaded, total_bytes,
+                                  f"Downloading {track_info['artist']} - {track_info['title']}",
+                                  {'speed': d.get('speed', 0), 'eta': d.get('eta', 0)},
+                                  track=track_info)
+            elif d['status'] == 'finished':
+                self.emit_progress('downloading', 100, 100,
+                               f"Download complete: {track_info['artist']} - {track_info['title']}",
+                               track=track_info)
+
+        download_opts['progress_hook'] = progress_hook
+        
+        # Media downloads run within the adaptive limit; throttling backs it off
+        # and the download is retried once the Retry-After pause is over
+        for attempt in range(THROTTLE_MAX_RETRIES + 1):
+            with self.download_limiter.slot():
+                try:
+                    info = self._fetch_source(job, download_opts)
+                except Exception as e:
+                    throttled, retry_after = throttle_info(e)
+                    if throttled:
+                        self.download_limiter.on_throttle(retry_after)
+                    elif is_upstream_error(e):
+                        self.download_limiter.on_error()
+                    if not throttled or attempt == THROTTLE_MAX_RETRIES:
+                        raise
+                    logger.warning(f"Media download throttled, retrying: {str(e)}")
+                    continue
+            size = os.path.getsize(job['source_path']) if os.path.exists(job['source_path']) else 0
+            STAGE_BYTES.inc(size, stage='download')
+            self.download_limiter.on_success(size)
+            break
+        job['duration'] = info.get('duration')
+        job['acodec'] = info.get('acodec')
+        job['info'] = None
+        return job
+
+    def _fetch_source(self, job: Dict, download_opts: Dict) -> Dict:
+        """Download the job's source stream with yt-dlp and return the info dict."""
+        from yt_dlp.utils import DownloadError
+        from ydl_pool import get_ydl_pool
+        track_info = job['track']
+        video = job['video']
+        # Reuse this worker's YoutubeDL; only the template, format and hook change per track
+        with get_ydl_pool('download').get(
+            outtmpl=download_opts['outtmpl'],
+            format_spec=download_opts['format'],
+            progress_hook=download_opts['progress_hook']
+        ) as ydl:
+            info = None
+            if job['info']:
+                # Fresh search result: download from it without extracting again
+                info = ydl.process_ie_result(job['info'], download=True)
+            else:
+                try:
+                    info = ydl.extract_info(video['url'], download=True)
+                except DownloadError as e:
+                    if throttle_info(e)[0]:
+                        raise
+                    # The video may have been removed; forget it and search again
+                    logger.warning(f"Indexed video {video['video_id']} failed, searching again: {str(e)}")
+                    if self.youtube_index:
+                        self.youtube_index.delete(track_info['id'])
+            if info is None:
+                info = self._search_youtube(ydl, track_info, download=True)
+            
+            requested = info.get('requested_downloads') or [{}]
+            job['source_path'] = requested[0].get('filepath') or ydl.prepare_filename(info)
+        return info
+
+    def _transcode_stage(self, job: Dict) -> Dict:
+        """Convert the downloaded source into the requested format and cache it."""
+        track_info = job['track']
+        self.emit_progress('converting', 0, 100, f"Converting to {job['format']}", track=track_info)
+        # Conversion runs on the shared process pool so it does not compete with
+        # the download threads for the GIL
+        _, method, error, samples = run_in_conversion_pool(
+            convert_in_worker,
+            job['source_path'],
+            job['format'],
+            job['output_path'],
+            job['acodec']
+        )
+        get_metrics().replay(samples)
+        if error:
+            raise Exception(error)
+        STAGE_BYTES.inc(os.path.getsize(job['output_path']), stage='transcode')
+        
+        # Remuxing and the direct ffmpeg pass avoid the WAV intermediate and the
+        # in-memory PCM decode the old extract-then-pydub path needed for this
+        # track; the pydub fallback still decodes it all
+        pcm_bytes_avoided = 0
+        if method in ('remux', 'ffmpeg') and job.get('duration'):
+            pcm_bytes_avoided = AudioConverter.pcm_size(job['duration'])
+        with self._lock:
+            self.pcm_bytes_avoided += pcm_bytes_avoided
+        self.emit_progress('converting', 100, 100, "Conversion complete",
+                       {'pcm_bytes_avoided': pcm_bytes_avoided}, track=track_info)
+        
+        if self.track_cache:
+            self.track_cache.put(track_info['id'], job['format'], AUDIO_QUALITY, job['output_path'])
+        return job
+
+    def _scheduled(self, handler: Callable[[Dict], Optional[Dict]]) -> Callable[[Dict], Optional[Dict]]:
+        """Wrap a stage handler so it runs in a scheduler slot, if there is a scheduler."""
+        if not self.scheduler:
+            return handler
+
+        def run(job: Dict) -> Optional[Dict]:
+            with self.scheduler.slot(self.job_id):
+                return handler(job)
+        return run
+
+    @staticmethod
+    def _timed(stage: str, handler: Callable[[Dict], Optional[Dict]]) -> Callable[[Dict], Optional[Dict]]:
+        """Wrap a stage handler to record its duration and failures."""
+        def run(job: Dict) -> Optional[Dict]:
+            started = time.monotonic()
+            try:
+                return handler(job)
+            except Exception:
+                STAGE_FAILURES.inc(stage=stage)
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.monotonic() - started, stage=stage)
+        return run
+
+    def _run_stages(self, job: Dict) -> str:
+        """Run a job through the search, download and transcode stages in this thread."""
+        for stage in (
+            self._scheduled(self._timed('search', self._search_stage)),
+            self._scheduled(self._timed('download', self._download_stage)),
+            self._timed('transcode', self._transcode_stage)
+        ):
+            if stage(job) is None:
+                break
+        return job['output_path']
+
+    def _receive_shared(self, job: Dict, shared_path: str):
+        """Deliver a download finished for another requester to this job's output path."""
+        if os.path.abspath(shared_path) != os.path.abspath(job['output_path']):
+            link_or_copy(shared_path, job['output_path'])
+        track_info = job['track']
+        self.emit_progress('downloading', 100, 100,
+                       f"Shared in-flight download: {track_info['artist']} - {track_info['title']}",
+                       track=track_info)
+
+    def _track_finished(self):
+        if self.scheduler:
+            self.scheduler.track_done(self.job_id)
 
     def download_track(
         self,
@@ -110,107 +637,147 @@ class SpotifyDownloader:
         output_format: str,
         output_dir: Optional[str] = None
     ) -> str:
-        """Download a single track."""
-        if self._check_active_download(track_info['id']):
-            raise Exception("Track is already being downloaded")
-            
+        """Download a single track and return the path of the output file.
+
+        If the same track and format is already being downloaded anywhere in
+        the process, this waits for that download and shares its file.
+        """
         try:
-            # Create filename
-            filename = sanitize_filename(
-                FILENAME_TEMPLATE.format(
-                    artist=track_info['artist'],
-                    title=track_info['title']
-                )
+            job = self._prepare_job(track_info, output_format, output_dir)
+            shared_path, shared = _track_flights.do(
+                (track_info['id'], output_format), lambda: self._run_stages(job)
             )
-            
-            # Set output directory
-            if not output_dir:
-                output_dir = DOWNLOAD_DIR
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Search query for YouTube
-            query = f"{track_info['artist']} - {track_info['title']} audio"
-            
-            # Configure download options with progress hook
-            download_opts = YTDLP_OPTIONS.copy()
-            download_opts['outtmpl'] = os.path.join(output_dir, filename + '.%(ext)s')
-            
-            def progress_hook(d):
-                if d['status'] == 'downloading':
-                    total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                    if total_bytes:
-                        downloaded = d.get('downloaded_bytes', 0)
-                        self.emit_progress('downloading', downloaded, total_bytes,
-                                      f"Downloading {track_info['artist']} - {track_info['title']}",
-                                      {'speed': d.get('speed', 0), 'eta': d.get('eta', 0)})
-                elif d['status'] == 'finished':
-                    self.emit_progress('downloading', 100, 100,
-                                   f"Download complete: {track_info['artist']} - {track_info['title']}")
-
-            download_opts['progress_hooks'] = [progress_hook]
-            
-            # Download the track
-            with yt_dlp.YoutubeDL(download_opts) as ydl:
-                ydl.download([f"ytsearch1:{query}"])
-            
-            # Convert to desired format if needed
-            if output_format != 'wav':
-                self.emit_progress('converting', 0, 100, f"Converting to {output_format}")
-                input_path = os.path.join(output_dir, f"{filename}.wav")
-                AudioConverter.convert_format(input_path, output_format)
-                self.emit_progress('converting', 100, 100, "Conversion complete")
-            
-            return filename
+            if shared:
+                self._receive_shared(job, shared_path)
+            TRACKS.inc(status='done')
+            self.emit_track_done(track_info)
+            return job['output_path']
             
         except Exception as e:
             logger.error(f"Download failed: {str(e)}")
+            TRACKS.inc(status='failed')
+            self.emit_track_done(track_info, f"Download failed: {str(e)}")
             raise Exception(f"Download failed: {str(e)}")
         finally:
-            self._remove_active_download(track_info['id'])
+            self._track_finished()
 
     def download_playlist_concurrent(
         self,
-        tracks: List[Dict],
+        tracks: Iterable[Dict],
         output_format: str,
         output_dir: Optional[str] = None,
-        max_workers: Optional[int] = None
+        max_workers: Optional[int] = None,
+        total_tracks: Optional[int] = None,
+        on_track_done: Optional[Callable[[Dict, Optional[str], Optional[str]], None]] = None
     ) -> List[str]:
-        """Download playlist tracks concurrently."""
+        """Download playlist tracks through the staged pipeline and return the output paths.
+
+        Search and download stages are I/O-bound thread pools; the transcode
+        stage is sized to the CPU count. Stages are connected by bounded
+        queues, so a slow stage throttles the ones feeding it. max_workers caps
+        the download threads; how many actually download at once is decided by
+        the adaptive download limiter. tracks may be a
+        lazy iterator (see stream_playlist_tracks). on_track_done, if given, is
+        called with (track, output_path, error) as each track finishes.
+
+        A track and format already being downloaded, by this playlist or by
+        any other job in the process, is not queued again: it waits for that
+        download without holding a pipeline worker and shares its file.
+        """
         if not max_workers:
-            max_workers = MAX_CONCURRENT_DOWNLOADS
+            # Enough download threads for the adaptive limit to grow into
+            max_workers = DOWNLOAD_CONCURRENCY_MAX
+        if total_tracks is None:
+            total_tracks = len(tracks)
 
         successful_downloads = []
         failed_downloads = []
-        
-        total_tracks = len(tracks)
         completed_tracks = 0
+        results_lock = threading.Lock()
         
         self.emit_progress('playlist_download', 0, total_tracks, "Starting playlist download")
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_track = {
-                executor.submit(
-                    self.download_track,
-                    track,
-                    output_format,
-                    output_dir
-                ): track for track in tracks
-            }
-            
-            for future in as_completed(future_to_track):
-                track = future_to_track[future]
-                try:
-                    filename = future.result()
-                    successful_downloads.append(filename)
-                except Exception as e:
+        shared_pending = []
+        
+        def finish(job, error):
+            nonlocal completed_tracks
+            self._track_finished()
+            with results_lock:
+                if error:
+                    logger.error(f"Download failed: {str(error)}")
+                    TRACKS.inc(status='failed')
                     failed_downloads.append({
-                        'track': track,
-                        'error': str(e)
+                        'track': job['track'],
+                        'error': f"Download failed: {str(error)}"
                     })
-                finally:
-                    completed_tracks += 1
-                    self.emit_progress('playlist_download', completed_tracks, total_tracks,
-                                   f"Completed {completed_tracks}/{total_tracks} tracks")
+                else:
+                    TRACKS.inc(status='done')
+                    successful_downloads.append(job['output_path'])
+                self.emit_track_done(job['track'], f"Download failed: {str(error)}" if error else None)
+                if on_track_done:
+                    try:
+                        on_track_done(
+                            job['track'],
+                            None if error else job['output_path'],
+                            f"Download failed: {str(error)}" if error else None
+                        )
+                    except Exception as e:
+                        logger.error(f"Error in track completion callback: {str(e)}")
+                completed_tracks += 1
+                self.emit_progress('playlist_download', completed_tracks, total_tracks,
+                               f"Completed {completed_tracks}/{total_tracks} tracks")
+        
+        def on_done(job, error):
+            # Wake requesters sharing this download before recording it here
+            _track_flights.resolve((job['track']['id'], output_format),
+                                   None if error else job['output_path'], error)
+            finish(job, error)
+        
+        def on_shared(job, flight, finished):
+            try:
+                error = flight.exception()
+                if error is None:
+                    try:
+                        self._receive_shared(job, flight.result())
+                    except Exception as e:
+                        error = e
+                finish(job, error)
+            finally:
+                finished.set()
+        
+        pipeline = Pipeline(
+            [
+                ('search', self._scheduled(self._timed('search', self._search_stage)), PIPELINE_SEARCH_WORKERS),
+                ('download', self._scheduled(self._timed('download', self._download_stage)), max_workers),
+                ('transcode', self._timed('transcode', self._transcode_stage), PIPELINE_TRANSCODE_WORKERS),
+            ],
+            on_done=on_done,
+            queue_size=PIPELINE_QUEUE_SIZE
+        )
+        pipeline.start()
+        try:
+            for track in tracks:
+                job = self._prepare_job(track, output_format, output_dir)
+                flight, leader = _track_flights.claim((track['id'], output_format))
+                if leader:
+                    pipeline.submit(job)
+                    continue
+                finished = threading.Event()
+                shared_pending.append(finished)
+                flight.add_done_callback(lambda flight, job=job, finished=finished: on_shared(job, flight, finished))
+        finally:
+            pipeline.join()
+            for finished in shared_pending:
+                finished.wait()
+        
+        self.pipeline_stats = pipeline.stats()
+        pipeline.log_stats()
+        logger.info(f"Direct transcoding avoided {self.pcm_bytes_avoided / 1024 ** 2:.1f} MB "
+                    f"of WAV intermediates and decoded PCM")
+        self.emit_progress('pipeline_stats', completed_tracks, total_tracks, "Pipeline stage utilization",
+                       {'stages': self.pipeline_stats,
+                        'limits': {'spotify': self.spotify_limiter.stats(),
+                                   'download': self.download_limiter.stats()}})
         
         # Report failed downloads
         if failed_downloads:
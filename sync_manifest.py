@@ -0,0 +1,147 @@
+import os
+import json
+import hashlib
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from config import DOWNLOAD_DIR
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '.spotify-sync.json'
+
+
+def file_sha256(path: str) -> str:
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SyncManifest:
+    """Record of what a sync has already placed in an output directory.
+
+    Stores the downloaded tracks (relative path, size, hash, format) and the
+    snapshot_id of every synced playlist.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.sources: Dict[str, Optional[str]] = {}
+        self.tracks: Dict[str, Dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            self.sources = data.get('sources', {})
+            self.tracks = data.get('tracks', {})
+
+    def save(self):
+        """Write the manifest atomically."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'sources': self.sources, 'tracks': self.tracks}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def has_track(self, track_id: str, output_format: str) -> bool:
+        """Return True if the track was synced in this format and its file is intact."""
+        entry = self.tracks.get(track_id)
+        if not entry or entry['format'] != output_format:
+            return False
+        path = os.path.join(self.output_dir, entry['path'])
+        return os.path.exists(path) and os.path.getsize(path) == entry['size']
+
+    def add_track(self, track_id: str, output_format: str, path: str):
+        """Record a freshly downloaded track."""
+        self.tracks[track_id] = {
+            'path': os.path.relpath(path, self.output_dir),
+            'format': output_format,
+            'size': os.path.getsize(path),
+            'sha256': file_sha256(path),
+            'synced_at': time.time()
+        }
+
+    def remove_track(self, track_id: str, delete_file: bool):
+        """Forget a track, optionally deleting its file."""
+        entry = self.tracks.pop(track_id, None)
+        if entry and delete_file:
+            path = os.path.join(self.output_dir, entry['path'])
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def sync(
+    downloader,
+    items: List[Tuple[str, str]],
+    output_format: str,
+    output_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    prune: bool = False
+) -> Dict:
+    """Bring output_dir in line with the given Spotify items.
+
+    Playlists whose snapshot_id is unchanged since the last sync are not
+    fetched at all; otherwise only tracks missing from the manifest are
+    downloaded, and tracks no longer present are pruned if requested.
+    Returns counts of added, kept, removed and failed tracks.
+    """
+    output_dir = output_dir or DOWNLOAD_DIR
+    manifest = SyncManifest(output_dir)
+    summary = {'added': 0, 'kept': 0, 'removed': 0, 'failed': 0, 'unchanged': False}
+
+    snapshots = {
+        f"playlist:{content_id}": downloader.get_playlist_snapshot(content_id)
+        for content_type, content_id in items if content_type == 'playlist'
+    }
+    sources = {f"{content_type}:{content_id}": None for content_type, content_id in items}
+    sources.update(snapshots)
+
+    # Short-circuit when every source is a playlist whose snapshot we already hold
+    if (
+        snapshots
+        and len(snapshots) == len(sources)
+        and all(manifest.sources.get(key) == snapshot for key, snapshot in snapshots.items())
+        and set(manifest.sources) == set(sources)
+        and all(manifest.has_track(track_id, output_format) for track_id in manifest.tracks)
+    ):
+        summary['kept'] = len(manifest.tracks)
+        summary['unchanged'] = True
+        return summary
+
+    _, tracks = downloader.resolve_tracks(items)
+    tracks = list(tracks)
+    wanted = {track['id'] for track in tracks}
+    missing = [track for track in tracks if not manifest.has_track(track['id'], output_format)]
+    summary['kept'] = len(tracks) - len(missing)
+
+    if missing:
+        successful_downloads = set(downloader.download_playlist_concurrent(
+            missing,
+            output_format,
+            output_dir,
+            max_workers,
+            total_tracks=len(missing)
+        ))
+        for track in missing:
+            path = downloader.output_path_for(track, output_format, output_dir)
+            if path in successful_downloads and os.path.exists(path):
+                manifest.add_track(track['id'], output_format, path)
+                summary['added'] += 1
+            else:
+                summary['failed'] += 1
+
+    if prune:
+        for track_id in [track_id for track_id in manifest.tracks if track_id not in wanted]:
+            manifest.remove_track(track_id, delete_file=True)
+            summary['removed'] += 1
+
+    # Only record new snapshots once every track of the snapshot is in place
+    if not summary['failed']:
+        manifest.sources = sources
+    manifest.save()
+    logger.info(f"Sync of {output_dir}: {summary}")
+    return summary
@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress import ProgressState
+
+
+def finished_job() -> ProgressState:
+    state = ProgressState()
+    state.update({'track_id': 't1', 'stage': 'downloading', 'current': 50, 'total': 100})
+    state.put({'type': 'track_done', 'track_id': 't1'})
+    state.put({'type': 'complete', 'successful_downloads': 1})
+    state.close()
+    return state
+
+
+def test_reconnect_with_id_from_previous_run_replays_everything():
+    previous = finished_job()
+    messages, _ = previous.read(None, timeout=0)
+    stale_id = messages[-1][0]
+
+    # The job is resumed after a restart under a new channel
+    resumed = finished_job()
+    messages, closed = resumed.read(stale_id, timeout=0)
+
+    assert messages[0][0] is None and messages[0][1]['type'] == 'progress'
+    assert [data['type'] for _, data in messages[1:]] == ['progress', 'track_done', 'complete']
+    assert all(message_id.startswith(resumed.epoch + '-') for message_id, _ in messages[1:])
+    assert closed
+
+
+def test_reconnect_with_id_ahead_of_channel_is_stale():
+    state = finished_job()
+    messages, closed = state.read(f"{state.epoch}-99", timeout=0)
+
+    assert [data['type'] for _, data in messages] == ['progress', 'progress', 'track_done', 'complete']
+    assert closed
+
+
+def test_reconnect_with_current_id_resumes_after_it():
+    state = finished_job()
+    messages, _ = state.read(None, timeout=0)
+
+    resumed, closed = state.read(messages[1][0], timeout=0)
+
+    assert [data['type'] for _, data in resumed] == ['complete']
+    assert closed
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+import logging
+from typing import Optional
+
+from config import TRACK_CACHE_DIR, TRACK_CACHE_MAX_BYTES
+from utils import link_or_copy
+
+logger = logging.getLogger(__name__)
+
+
+class TrackCache:
+    """On-disk cache of finished tracks keyed by (track ID, format, quality)."""
+
+    def __init__(self, cache_dir: str = TRACK_CACHE_DIR, max_bytes: int = TRACK_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, 'index.sqlite3'),
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                track_id TEXT NOT NULL,
+                format TEXT NOT NULL,
+                quality TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+
+    @staticmethod
+    def make_key(track_id: str, output_format: str, quality: str) -> str:
+        """Return the content address for a track rendition."""
+        return hashlib.sha256(f"{track_id}:{output_format}:{quality}".encode()).hexdigest()
+
+    def _object_path(self, key: str, output_format: str) -> str:
+        return os.path.join(self.objects_dir, key[:2], f"{key}.{output_format}")
+
+    def get(self, track_id: str, output_format: str, quality: str) -> Optional[str]:
+        """Return the cached file path for a track, or None on a miss."""
+        key = self.make_key(track_id, output_format, quality)
+        with self._lock:
+            row = self._db.execute('SELECT path FROM entries WHERE key = ?', (key,)).fetchone()
+            if not row:
+                return None
+            if not os.path.exists(row[0]):
+                # Object vanished from disk behind our back; drop the stale entry
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                return None
+            self._db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+            return row[0]
+
+    def materialize(self, track_id: str, output_format: str, quality: str, dest_path: str) -> bool:
+        """Link or copy a cached track to dest_path. Returns False on a miss."""
+        cached_path = self.get(track_id, output_format, quality)
+        if not cached_path:
+            return False
+        try:
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            link_or_copy(cached_path, dest_path)
+            logger.debug(f"Track cache hit for {track_id} ({output_format})")
+            return True
+        except OSError as e:
+            logger.error(f"Failed to materialize cached track {track_id}: {str(e)}")
+            return False
+
+    def put(self, track_id: str, output_format: str, quality: str, src_path: str) -> Optional[str]:
+        """Store a finished track in the cache and return its cached path."""
+        key = self.make_key(track_id, output_format, quality)
+        object_path = self._object_path(key, output_format)
+        try:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.{threading.get_ident()}.tmp"
+            link_or_copy(src_path, tmp_path)
+            os.replace(tmp_path, object_path)
+            size = os.path.getsize(object_path)
+        except OSError as e:
+            logger.error(f"Failed to cache track {track_id}: {str(e)}")
+            return None
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, track_id, output_format, quality, object_path, size, now, now)
+            )
+            self._evict()
+        return object_path
+
+    def total_size(self) -> int:
+        """Return the number of bytes currently held by the cache."""
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its budget."""
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute('SELECT key, path, size FROM entries ORDER BY last_access').fetchall()
+        for key, path, size in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error evicting cached track {path}: {str(e)}")
+                continue
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            logger.debug(f"Evicted cached track: {path}")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_track_cache() -> TrackCache:
+    """Return the process-wide track cache."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = TrackCache()
+        return _shared_cache
@@ -1,22 +1,44 @@
+import os
 import re
-from typing import Tuple, Optional
-from tqdm import tqdm
+import shutil
+from typing import TYPE_CHECKING, List, Tuple, Optional
+
+if TYPE_CHECKING:
+    from tqdm import tqdm
+
+SPOTIFY_URL_PATTERNS = {
+    'track': r'spotify(?:\.com/(?:intl-[a-z-]+/)?|:)track[/:]([a-zA-Z0-9]+)',
+    'playlist': r'spotify(?:\.com/(?:intl-[a-z-]+/)?|:)playlist[/:]([a-zA-Z0-9]+)',
+    'album': r'spotify(?:\.com/(?:intl-[a-z-]+/)?|:)album[/:]([a-zA-Z0-9]+)',
+    'artist': r'spotify(?:\.com/(?:intl-[a-z-]+/)?|:)artist[/:]([a-zA-Z0-9]+)'
+}
 
 def parse_spotify_url(url: str) -> Tuple[Optional[str], Optional[str]]:
     """Parse Spotify URL to get type and ID."""
-    patterns = {
-        'track': r'spotify.com/track/([a-zA-Z0-9]+)',
-        'playlist': r'spotify.com/playlist/([a-zA-Z0-9]+)'
-    }
-    
-    for content_type, pattern in patterns.items():
+    for content_type, pattern in SPOTIFY_URL_PATTERNS.items():
         match = re.search(pattern, url)
         if match:
             return content_type, match.group(1)
     return None, None
 
-def create_progress_bar(total: int, desc: str) -> tqdm:
+def parse_spotify_urls(text: str) -> List[Tuple[str, str]]:
+    """Parse whitespace or comma separated Spotify URLs/URIs into (type, ID) pairs.
+
+    Raises ValueError naming the first entry that is not a Spotify URL.
+    """
+    items = []
+    for url in re.split(r'[\s,]+', text.strip()):
+        if not url:
+            continue
+        content_type, content_id = parse_spotify_url(url)
+        if not content_type:
+            raise ValueError(f"Invalid Spotify URL: {url}")
+        items.append((content_type, content_id))
+    return items
+
+def create_progress_bar(total: int, desc: str) -> 'tqdm':
     """Create a progress bar with consistent styling."""
+    from tqdm import tqdm
     return tqdm(
         total=total,
         desc=desc,
@@ -27,3 +49,23 @@ def create_progress_bar(total: int, desc: str) -> tqdm:
 def sanitize_filename(filename: str) -> str:
     """Remove invalid characters from filename."""
     return re.sub(r'[<>:"/\\|?*]', '', filename)
+
+def link_or_copy(src: str, dest: str):
+    """Hardlink src to dest, falling back to a copy across filesystems.
+
+    A copy is written under a temporary name and renamed into place, so
+    anything watching dest's directory never sees a partial file.
+    """
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        tmp_path = dest + '.part'
+        try:
+            shutil.copy2(src, tmp_path)
+            os.replace(tmp_path, dest)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
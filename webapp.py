@@ -1,17 +1,24 @@
 from flask import Flask, render_template, request, jsonify, send_file, Response
 import os
-import zipfile
+import re
+import time
 from spotify_downloader import SpotifyDownloader
-from utils import parse_spotify_url
-from config import SUPPORTED_FORMATS, DOWNLOAD_DIR
+from utils import parse_spotify_urls
+from zip_stream import iter_zip
+from job_journal import get_job_journal
+from expiry_index import get_expiry_index
+from metrics import get_metrics
+from progress import ProgressState
+from search_cache import get_search_cache
+from scheduler import SchedulerFull, get_scheduler
+from concurrency import get_limiter
+from config import SUPPORTED_FORMATS, DOWNLOAD_DIR, SCHEDULER_RETRY_AFTER
 import json
-import queue
+import hashlib
 import threading
 from datetime import datetime, timedelta
 import logging
 import shutil
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -19,10 +26,8 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Global progress queue for SSE updates
-progress_queues = {}
-# Global downloads tracking
-current_downloads = {}
+# Global progress state for SSE updates
+progress_states = {}
 # Global cancellation tracking
 cancel_flags = {}
 # Global download threads
@@ -37,69 +42,73 @@ MAX_CONNECTION_AGE = timedelta(minutes=30)
 MAX_RETRY_ATTEMPTS = 5
 # Base delay for exponential backoff (in seconds)
 BASE_RETRY_DELAY = 1
-# Maximum age for downloaded files (24 hours)
-MAX_FILE_AGE = timedelta(hours=24)
-# Cleanup interval (1 hour)
-CLEANUP_INTERVAL = timedelta(hours=1)
+# Cleanup interval (5 minutes); expiry is indexed, so frequent sweeps are cheap
+CLEANUP_INTERVAL = timedelta(minutes=5)
+# How often a following ZIP stream checks for newly finished tracks (in seconds)
+ZIP_FOLLOW_POLL_INTERVAL = 1
+
+# Whether init_app has run in this process
+_initialized = False
+_init_lock = threading.Lock()
+
+def create_app():
+    """Return the Flask app, initializing the process on the first call.
+
+    Importing this module only defines the app and its routes; servers call
+    this factory (e.g. ``gunicorn 'webapp:create_app()'``) so cleanup, the
+    cleanup thread and job resumption start once the process actually serves.
+    """
+    global _initialized
+    with _init_lock:
+        if not _initialized:
+            init_app()
+            _initialized = True
+    return app
 
 def init_app():
     """Initialize the application."""
-    # Clear downloads directory on startup
-    cleanup_downloads(force=True)
+    # Expire old downloads on startup; work of interrupted jobs is kept for resuming
+    cleanup_downloads()
     # Schedule periodic cleanup
     schedule_cleanup()
+    # Pick up jobs interrupted by a restart or crash
+    resume_downloads()
 
 def schedule_cleanup():
     """Schedule periodic cleanup of downloads directory."""
     def cleanup_task():
         while True:
             cleanup_downloads()
+            expire_progress_states()
             threading.Event().wait(CLEANUP_INTERVAL.total_seconds())
     
     cleanup_thread = threading.Thread(target=cleanup_task, daemon=True)
     cleanup_thread.start()
 
 def cleanup_downloads(force=False):
-    """Clean up old downloads."""
+    """Remove expired downloads (see DOWNLOAD_TTL) using the expiry index."""
     try:
-        current_time = datetime.now()
-        if os.path.exists(DOWNLOAD_DIR):
-            # If force is True, remove everything
-            if force:
-                shutil.rmtree(DOWNLOAD_DIR)
-                os.makedirs(DOWNLOAD_DIR)
-                logger.info("Downloads directory cleared")
-                return
-
-            # Remove old files and empty directories
-            for root, dirs, files in os.walk(DOWNLOAD_DIR, topdown=False):
-                # Remove old files
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                    if current_time - file_time > MAX_FILE_AGE:
-                        try:
-                            os.remove(file_path)
-                            logger.debug(f"Removed old file: {file_path}")
-                        except Exception as e:
-                            logger.error(f"Error removing file {file_path}: {str(e)}")
-                
-                # Remove empty directories
-                for dir in dirs:
-                    dir_path = os.path.join(root, dir)
-                    try:
-                        if not os.listdir(dir_path):
-                            os.rmdir(dir_path)
-                            logger.debug(f"Removed empty directory: {dir_path}")
-                    except Exception as e:
-                        logger.error(f"Error removing directory {dir_path}: {str(e)}")
+        index = get_expiry_index()
+        # If force is True, remove everything
+        if force and os.path.exists(DOWNLOAD_DIR):
+            shutil.rmtree(DOWNLOAD_DIR)
+            index.clear()
+            logger.info("Downloads directory cleared")
         
         # Ensure downloads directory exists
         os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        index.expire()
         
     except Exception as e:
         logger.error(f"Error during cleanup: {str(e)}")
 
+def expire_progress_states():
+    """Drop progress channels of jobs that finished more than MAX_CONNECTION_AGE ago."""
+    cutoff = time.time() - MAX_CONNECTION_AGE.total_seconds()
+    for queue_id, progress in list(progress_states.items()):
+        if progress.closed and progress.closed_at < cutoff:
+            progress_states.pop(queue_id, None)
+
 def cleanup_stale_connections():
     """Clean up stale SSE connections."""
     current_time = datetime.now()
@@ -114,84 +123,124 @@ def cleanup_stale_connections():
         cleanup_download(queue_id)
 
 def get_spotify_client():
-    """Get authenticated Spotify client."""
+    """Get the shared, authenticated Spotify client."""
     client_id = os.environ.get('SPOTIFY_CLIENT_ID')
     client_secret = os.environ.get('SPOTIFY_CLIENT_SECRET')
     
     if not client_id or not client_secret:
         raise ValueError("Spotify credentials not configured")
-        
-    return spotipy.Spotify(
-        client_credentials_manager=SpotifyClientCredentials(
-            client_id=client_id,
-            client_secret=client_secret
-        )
-    )
+    
+    # spotipy is imported on the first search rather than at startup
+    import spotify_client
+    return spotify_client.get_spotify_client(client_id, client_secret)
 
 @app.route('/search')
 def search_tracks():
     """Search for tracks on Spotify."""
+    payload, status = search_spotify(
+        request.args.get('q'),
+        request.args.get('offset', 0),
+        request.args.get('limit', 5)
+    )
+    return jsonify(payload), status
+
+def search_spotify(query, offset, limit):
+    """Run a Spotify track search and return (payload, HTTP status).
+
+    Pages come from the shared search cache, which coalesces identical
+    concurrent searches and prefetches the next page. Shared by the Flask
+    route and the ASGI app.
+    """
     try:
-        query = request.args.get('q')
-        offset = int(request.args.get('offset', 0))
-        limit = int(request.args.get('limit', 5))
+        offset = int(offset)
+        limit = int(limit)
 
         if not query:
-            return jsonify({'error': 'Query parameter is required'}), 400
+            return {'error': 'Query parameter is required'}, 400
 
-        sp = get_spotify_client()
-        results = sp.search(q=query, type='track', limit=limit, offset=offset)
-        
-        if not results or 'tracks' not in results:
-            return jsonify({'error': 'No results found'}), 404
-
-        tracks = []
-        for track in results['tracks']['items']:
-            tracks.append({
-                'id': track['id'],
-                'title': track['name'],
-                'artist': track['artists'][0]['name'],
-                'album': track['album']['name'],
-                'duration': track['duration_ms'] // 1000,
-                'url': track['external_urls']['spotify'],
-                'image': track['album']['images'][0]['url'] if track['album']['images'] else None
-            })
+        page = get_search_cache().search(query, offset, limit, fetch_search_page)
+        if page is None:
+            return {'error': 'No results found'}, 404
 
-        return jsonify({
-            'tracks': tracks,
-            'total': results['tracks']['total'],
+        return {
+            'tracks': page['tracks'],
+            'total': page['total'],
             'offset': offset,
             'limit': limit
-        })
+        }, 200
 
     except Exception as e:
         logger.error(f"Error searching tracks: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        return {'error': str(e)}, 500
+
+def fetch_search_page(query, offset, limit):
+    """Fetch one page of Spotify track search results, or None if there are none.
+
+    Searches share the downloads' Spotify limiter, so they back off on 429s
+    and are retried like every other API call.
+    """
+    from spotify_client import limited_call
+    sp = get_spotify_client()
+    results = limited_call(get_limiter('spotify'), sp.search, q=query, type='track', limit=limit, offset=offset)
+    
+    if not results or 'tracks' not in results:
+        return None
+
+    tracks = []
+    for track in results['tracks']['items']:
+        tracks.append({
+            'id': track['id'],
+            'title': track['name'],
+            'artist': track['artists'][0]['name'],
+            'album': track['album']['name'],
+            'duration': track['duration_ms'] // 1000,
+            'url': track['external_urls']['spotify'],
+            'image': track['album']['images'][0]['url'] if track['album']['images'] else None
+        })
+    return {'tracks': tracks, 'total': results['tracks']['total']}
+
+@app.route('/search/stats')
+def search_stats():
+    """Return search cache hit rate and coalescing/prefetch counters."""
+    return jsonify(get_search_cache().stats())
 
 @app.route('/')
 def index():
     return render_template('index.html', formats=SUPPORTED_FORMATS)
 
-def cleanup_download(queue_id):
-    """Clean up resources for a download."""
+def cleanup_download(queue_id, remove_files=True):
+    """Clean up resources for a download.
+
+    Finished jobs keep their files (they expire via cleanup_downloads) and
+    their progress channel (see expire_progress_states), so they can still
+    be fetched and watched; cancelled jobs have both removed.
+    """
     try:
         # Remove from global tracking
-        progress_queues.pop(queue_id, None)
+        if remove_files:
+            progress = progress_states.pop(queue_id, None)
+            if progress:
+                progress.put({'type': 'cancelled'})
+                progress.close()
         connection_status.pop(queue_id, None)
         connection_timestamps.pop(queue_id, None)
         cancel_flags.pop(queue_id, None)
         
         # Stop any running threads
         thread = download_threads.pop(queue_id, None)
-        if thread and thread.is_alive():
+        if thread and thread.is_alive() and thread is not threading.current_thread():
             cancel_flags[queue_id] = True
             thread.join(timeout=5)
         
+        if remove_files:
+            get_job_journal().set_job_status(queue_id, 'cancelled')
+        
         # Clean up download directory
         download_path = os.path.join(DOWNLOAD_DIR, queue_id)
-        if os.path.exists(download_path):
+        if remove_files and os.path.exists(download_path):
             shutil.rmtree(download_path)
             os.makedirs(download_path, exist_ok=True)
+            get_expiry_index().forget_job_files(queue_id)
             
         logger.debug(f"Cleanup completed for queue {queue_id}")
     except Exception as e:
@@ -201,7 +250,7 @@ def cleanup_download(queue_id):
 def cancel_download():
     """Cancel ongoing downloads."""
     try:
-        for queue_id in list(progress_queues.keys()):
+        for queue_id in list(download_threads.keys()):
             cancel_flags[queue_id] = True
             cleanup_download(queue_id)
         return jsonify({'status': 'cancelled'})
@@ -212,108 +261,297 @@ def cancel_download():
 @app.route('/download', methods=['POST'])
 def download():
     """Handle download requests."""
+    payload, status, headers = submit_download(request.form.get('spotify_url'), request.form.get('format'))
+    return jsonify(payload), status, headers
+
+def submit_download(spotify_url, output_format):
+    """Validate a download request and start (or reattach to) its job.
+
+    Returns (payload, HTTP status, extra headers); shared by the Flask route
+    and the ASGI app.
+    """
     try:
         # Validate input
-        spotify_url = request.form.get('spotify_url')
-        output_format = request.form.get('format')
-        
         if not spotify_url or not output_format:
-            return jsonify({'error': 'Missing required parameters'}), 400
+            return {'error': 'Missing required parameters'}, 400, {}
         
         if output_format not in SUPPORTED_FORMATS:
-            return jsonify({'error': 'Unsupported format'}), 400
+            return {'error': 'Unsupported format'}, 400, {}
         
-        content_type, content_id = parse_spotify_url(spotify_url)
-        if not content_type or not content_id:
-            return jsonify({'error': 'Invalid Spotify URL'}), 400
+        try:
+            items = parse_spotify_urls(spotify_url)
+        except ValueError as e:
+            return {'error': str(e)}, 400, {}
+        if not items:
+            return {'error': 'Invalid Spotify URL'}, 400, {}
         
         # Check for existing download
-        queue_id = f"{content_type}_{content_id}"
-        if queue_id in progress_queues:
-            logger.warning(f"Existing download found for {queue_id}")
-            return jsonify({'error': 'Download already in progress'}), 409
-        
-        # Initialize download resources
-        progress_queue = queue.Queue()
-        progress_queues[queue_id] = progress_queue
-        cancel_flags[queue_id] = False
-        connection_status[queue_id] = 'initializing'
-        connection_timestamps[queue_id] = datetime.now()
-        
-        # Create download directory
-        download_path = os.path.join(DOWNLOAD_DIR, queue_id)
-        os.makedirs(download_path, exist_ok=True)
+        queue_id = make_queue_id(items, output_format)
+        if is_download_running(queue_id):
+            # Let the client reattach to the job that is already running
+            logger.info(f"Reattaching to existing download {queue_id}")
+            return {
+                'queue_id': queue_id,
+                'zip_url': f"/download/{queue_id}/zip?follow=1",
+                'reattached': True
+            }, 200, {}
         
-        # Initialize downloader
         client_id = os.environ.get('SPOTIFY_CLIENT_ID')
         client_secret = os.environ.get('SPOTIFY_CLIENT_SECRET')
         
         if not client_id or not client_secret:
-            return jsonify({'error': 'Spotify credentials not configured'}), 500
-            
-        downloader = SpotifyDownloader(client_id, client_secret, progress_queue)
+            return {'error': 'Spotify credentials not configured'}, 500, {}
+        
+        # Admission control: refuse new jobs while the global queue is full
+        try:
+            single_track = len(items) == 1 and items[0][0] == 'track'
+            queue_position = get_scheduler().register(queue_id, 1 if single_track else None)
+        except SchedulerFull as e:
+            return (
+                {'error': str(e), 'queue_position': e.queue_position},
+                429,
+                {'Retry-After': str(SCHEDULER_RETRY_AFTER)}
+            )
+        
+        try:
+            start_download(queue_id, spotify_url, items, output_format)
+        except Exception:
+            get_scheduler().unregister(queue_id)
+            raise
         
-        def download_task():
-            try:
-                if content_type == 'track':
-                    track_info = downloader.get_track_info(content_id)
-                    if not cancel_flags.get(queue_id):
-                        filename = downloader.download_track(
+        # Tracks can be streamed as a ZIP while the job is still running
+        return {
+            'queue_id': queue_id,
+            'zip_url': f"/download/{queue_id}/zip?follow=1",
+            'queue_position': queue_position
+        }, 200, {}
+        
+    except Exception as e:
+        logger.error(f"Error initiating download: {str(e)}")
+        return {'error': str(e)}, 500, {}
+
+def make_queue_id(items, output_format):
+    """Derive a stable queue ID from parsed Spotify items and the output format.
+
+    The format is part of the ID, so the same content requested in another
+    format is a separate job with its own directory and journal entry.
+    """
+    if len(items) == 1:
+        content_type, content_id = items[0]
+        return f"{content_type}_{content_id}_{output_format}"
+    digest = hashlib.sha1(','.join(sorted(f"{t}:{i}" for t, i in items)).encode()).hexdigest()
+    return f"batch_{digest[:16]}_{output_format}"
+
+def start_download(queue_id, spotify_url, items, output_format):
+    """Register a download job in the journal and run it in a background thread.
+
+    Tracks the journal already lists as done (with their files still on disk)
+    are skipped, which is how jobs resume after a restart.
+    """
+    journal = get_job_journal()
+    journal.start_job(queue_id, spotify_url, output_format)
+    completed_ids = journal.completed_tracks(queue_id, output_format)
+    
+    # Initialize download resources
+    progress = ProgressState()
+    progress_states[queue_id] = progress
+    cancel_flags[queue_id] = False
+    connection_status[queue_id] = 'initializing'
+    connection_timestamps[queue_id] = datetime.now()
+    
+    # Create download directory; partial files left by a previous run are resumed
+    download_path = os.path.join(DOWNLOAD_DIR, queue_id)
+    os.makedirs(download_path, exist_ok=True)
+    # Outputs are indexed for expiry as they finish; a running job is never evicted
+    expiry_index = get_expiry_index()
+    expiry_index.add_job(queue_id, download_path)
+    expiry_index.pin(queue_id)
+    
+    # Initialize downloader; its searches and downloads share the global scheduler
+    client_id = os.environ.get('SPOTIFY_CLIENT_ID')
+    client_secret = os.environ.get('SPOTIFY_CLIENT_SECRET')
+    scheduler = get_scheduler()
+    downloader = SpotifyDownloader(client_id, client_secret, progress,
+                                   scheduler=scheduler, job_id=queue_id)
+    zip_url = f"/download/{queue_id}/zip"
+    
+    def pending_tracks(tracks):
+        for track in tracks:
+            if track['id'] in completed_ids:
+                continue
+            journal.add_track(queue_id, track)
+            yield track
+    
+    def on_track_done(track, output_path, error):
+        journal.mark_track(queue_id, track, 'failed' if error else 'done', output_path, error)
+        if output_path and not error:
+            expiry_index.add_file(queue_id, output_path)
+    
+    def download_task():
+        try:
+            if len(items) == 1 and items[0][0] == 'track':
+                track_info = downloader.get_track_info(items[0][1])
+                # A resumed job may have finished the track before the restart
+                downloaded = track_info['id'] in completed_ids
+                if not cancel_flags.get(queue_id) and not downloaded:
+                    journal.add_track(queue_id, track_info)
+                    try:
+                        output_path = downloader.download_track(
                             track_info,
                             output_format,
                             download_path
                         )
-                        progress_queue.put({
+                    except Exception as e:
+                        on_track_done(track_info, None, str(e))
+                        raise
+                    on_track_done(track_info, output_path, None)
+                    downloaded = True
+                if downloaded and not cancel_flags.get(queue_id):
+                    progress.put({
+                        'type': 'complete',
+                        'successful_downloads': 1,
+                        'message': f'Successfully downloaded: {track_info["artist"]} - {track_info["title"]}',
+                        'zip_url': zip_url
+                    })
+            else:  # playlist, album, artist or several URLs
+                total_tracks, tracks = downloader.resolve_tracks(items)
+                remaining_tracks = max(total_tracks - len(completed_ids), 0)
+                scheduler.set_total(queue_id, remaining_tracks)
+                if not cancel_flags.get(queue_id):
+                    successful_downloads = downloader.download_playlist_concurrent(
+                        pending_tracks(tracks),
+                        output_format,
+                        download_path,
+                        total_tracks=remaining_tracks,
+                        on_track_done=on_track_done
+                    )
+                    finished = len(successful_downloads) + len(completed_ids)
+                    if finished:
+                        progress.put({
                             'type': 'complete',
-                            'successful_downloads': 1,
-                            'message': f'Successfully downloaded: {track_info["artist"]} - {track_info["title"]}'
+                            'successful_downloads': finished,
+                            'message': f'Successfully downloaded {finished} tracks',
+                            'zip_url': zip_url
                         })
-                else:  # playlist
-                    tracks = downloader.get_playlist_tracks(content_id)
-                    if not cancel_flags.get(queue_id):
-                        successful_downloads = downloader.download_playlist_concurrent(
-                            tracks,
-                            output_format,
-                            download_path
-                        )
-                        if successful_downloads:
-                            try:
-                                zip_path = create_zip_file(tracks, output_format, queue_id)
-                                current_downloads['latest_zip'] = zip_path
-                                progress_queue.put({
-                                    'type': 'complete',
-                                    'successful_downloads': len(successful_downloads),
-                                    'message': f'Successfully downloaded {len(successful_downloads)} tracks'
-                                })
-                            except Exception as e:
-                                raise Exception(f"Error creating ZIP file: {str(e)}")
-            except Exception as e:
-                logger.error(f"Error in download task: {str(e)}")
-                progress_queue.put({
-                    'type': 'error',
-                    'message': str(e)
-                })
-            finally:
-                progress_queue.put(None)
-                cleanup_download(queue_id)
-        
-        # Start download in background
-        download_thread = threading.Thread(target=download_task, daemon=True)
-        download_thread.start()
-        download_threads[queue_id] = download_thread
-        
-        return jsonify({'queue_id': queue_id})
-        
-    except Exception as e:
-        logger.error(f"Error initiating download: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+            if not cancel_flags.get(queue_id):
+                journal.set_job_status(queue_id, 'complete')
+        except Exception as e:
+            logger.error(f"Error in download task: {str(e)}")
+            journal.set_job_status(queue_id, 'failed', str(e))
+            progress.put({
+                'type': 'error',
+                'message': str(e)
+            })
+        finally:
+            scheduler.unregister(queue_id)
+            expiry_index.unpin(queue_id)
+            progress.close()
+            cleanup_download(queue_id, remove_files=False)
+    
+    # Start download in background
+    download_thread = threading.Thread(target=download_task, daemon=True)
+    download_thread.start()
+    download_threads[queue_id] = download_thread
+
+def resume_downloads():
+    """Restart jobs the journal shows as running when the process stopped."""
+    if not os.environ.get('SPOTIFY_CLIENT_ID') or not os.environ.get('SPOTIFY_CLIENT_SECRET'):
+        return
+    for job in get_job_journal().unfinished_jobs():
+        if is_download_running(job['queue_id']):
+            continue
+        try:
+            items = parse_spotify_urls(job['spotify_url'])
+            logger.info(f"Resuming download {job['queue_id']}")
+            get_scheduler().register(job['queue_id'], force=True)
+            start_download(job['queue_id'], job['spotify_url'], items, job['output_format'])
+        except Exception as e:
+            logger.error(f"Error resuming download {job['queue_id']}: {str(e)}")
+            get_job_journal().set_job_status(job['queue_id'], 'failed', str(e))
+
+@app.route('/jobs/<queue_id>')
+def job_status(queue_id):
+    """Return the journaled state of a download job."""
+    job = get_job_journal().get_job(queue_id)
+    if not job:
+        return jsonify({'error': 'Download not found'}), 404
+    job['running'] = is_download_running(queue_id)
+    job['queue_position'] = get_scheduler().queue_position(queue_id)
+    return jsonify(job)
+
+@app.route('/storage')
+def storage_status():
+    """Return download disk usage against its budget and bytes reclaimed."""
+    return jsonify(get_expiry_index().stats())
+
+@app.route('/metrics')
+def metrics():
+    """Expose per-stage timings and counters in the Prometheus text format."""
+    return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/scheduler')
+def scheduler_status():
+    """Return global slot usage and the state of every scheduled job."""
+    return jsonify(get_scheduler().stats())
+
+def is_download_running(queue_id):
+    """Return True while the background task for a download is alive."""
+    thread = download_threads.get(queue_id)
+    return bool(thread and thread.is_alive())
+
+def iter_job_files(queue_id, download_path, follow):
+    """Yield (path, archive name) for each finished track of a job.
+
+    With follow set, keep watching the job directory and yield tracks as
+    they complete until the download task ends.
+    """
+    sent = set()
+    while True:
+        running = is_download_running(queue_id)
+        for name in sorted(os.listdir(download_path)):
+            # Outputs are renamed into place when complete; skip sources and temp files
+            extension = os.path.splitext(name)[1].lstrip('.')
+            if name in sent or '.source.' in name or extension not in SUPPORTED_FORMATS:
+                continue
+            sent.add(name)
+            yield os.path.join(download_path, name), name
+        if not follow or not running:
+            return
+        time.sleep(ZIP_FOLLOW_POLL_INTERVAL)
+
+@app.route('/download/<queue_id>/zip')
+def download_zip(queue_id):
+    """Stream a job's tracks as a ZIP archive, optionally following the job."""
+    if not re.fullmatch(r'[A-Za-z0-9_]+', queue_id):
+        return jsonify({'error': 'Invalid queue ID'}), 400
+    
+    download_path = os.path.join(DOWNLOAD_DIR, queue_id)
+    if not os.path.isdir(download_path):
+        return jsonify({'error': 'Download not found'}), 404
+    
+    follow = request.args.get('follow') == '1'
+    get_expiry_index().touch_job(queue_id)
+    return Response(
+        iter_zip(iter_job_files(queue_id, download_path, follow)),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename="{queue_id}.zip"',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
 
 @app.route('/progress/<queue_id>')
 def progress(queue_id):
-    """SSE endpoint for progress updates."""
+    """SSE endpoint for progress updates.
+
+    Clients resume after a dropped connection by sending the standard
+    Last-Event-ID header (or a last_event_id query parameter).
+    """
     try:
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
         return Response(
-            progress_event_stream(queue_id),
+            progress_event_stream(queue_id, last_event_id),
             mimetype='text/event-stream',
             headers={
                 'Cache-Control': 'no-cache',
@@ -325,47 +563,47 @@ def progress(queue_id):
         logger.error(f"Error in progress stream: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-def progress_event_stream(queue_id):
-    """Generate SSE events for progress updates."""
+def progress_event_stream(queue_id, last_event_id=None):
+    """Generate SSE events for progress updates.
+
+    Every watcher reads the job's progress channel independently, so any
+    number of them can follow one job; each message carries an SSE id for
+    replay. Disconnecting only ends this stream, never the job.
+    """
     logger.debug(f"Starting SSE stream for queue_id: {queue_id}")
     
-    if queue_id not in progress_queues:
+    progress = progress_states.get(queue_id)
+    if progress is None:
         yield f"data: {json.dumps({'type': 'error', 'message': 'Invalid queue ID'})}\n\n"
         return
         
+    connected_at = datetime.now()
+    connection_status[queue_id] = 'connected'
+    connection_timestamps[queue_id] = connected_at
     try:
-        progress_queue = progress_queues[queue_id]
-        connection_status[queue_id] = 'connected'
-        connection_timestamps[queue_id] = datetime.now()
-        
         yield f"data: {json.dumps({'type': 'connected', 'queue_id': queue_id})}\n\n"
         
         while True:
-            try:
-                if cancel_flags.get(queue_id):
-                    yield f"data: {json.dumps({'type': 'cancelled'})}\n\n"
-                    break
-                    
-                if datetime.now() - connection_timestamps[queue_id] > MAX_CONNECTION_AGE:
-                    yield f"data: {json.dumps({'type': 'timeout'})}\n\n"
-                    break
-                    
-                data = progress_queue.get(timeout=30)
-                if data is None:
-                    break
-                    
-                yield f"data: {json.dumps(data)}\n\n"
+            if datetime.now() - connected_at > MAX_CONNECTION_AGE:
+                yield f"data: {json.dumps({'type': 'timeout'})}\n\n"
+                break
                 
-            except queue.Empty:
-                continue
+            messages, closed = progress.read(last_event_id, timeout=30)
+            for message_id, data in messages:
+                if message_id is None:
+                    yield f"data: {json.dumps(data)}\n\n"
+                else:
+                    last_event_id = message_id
+                    yield f"id: {message_id}\ndata: {json.dumps(data)}\n\n"
+            if closed:
+                break
                 
     except GeneratorExit:
         logger.debug(f"Client disconnected from queue {queue_id}")
-    finally:
-        cleanup_download(queue_id)
-
-# Initialize app on startup
-init_app()
 
 if __name__ == '__main__':
+    # The debug reloader runs this module in a watcher process and in the serving
+    # child it restarts; only the child may resume jobs and start the cleanup thread
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        create_app()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,105 @@
+import copy
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+import yt_dlp
+
+from config import YTDLP_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+ProgressHook = Callable[[Dict], None]
+
+
+class _PooledYoutubeDL:
+    """A long-lived YoutubeDL plus the per-call state routed into it."""
+
+    def __init__(self, options: Dict):
+        # configure() mutates params in place, so each instance needs its own copy
+        self.ydl = yt_dlp.YoutubeDL(copy.deepcopy(options))
+        self.progress_hook: Optional[ProgressHook] = None
+        self.format_selectors: Dict[str, Callable] = {}
+        self.default_outtmpl = self.ydl.params['outtmpl']['default']
+        # One permanent hook forwards to whichever call currently owns the instance
+        self.ydl.add_progress_hook(self._route_progress)
+
+    def _route_progress(self, status: Dict):
+        if self.progress_hook:
+            self.progress_hook(status)
+
+    def configure(self, outtmpl: Optional[str], format_spec: Optional[str], progress_hook: Optional[ProgressHook]):
+        params = self.ydl.params
+        params['outtmpl']['default'] = outtmpl or self.default_outtmpl
+        format_spec = format_spec or YTDLP_OPTIONS['format']
+        if params.get('format') != format_spec:
+            # The format selector is compiled once in YoutubeDL.__init__; rebuild it
+            # (from a per-instance cache) when a call asks for a different format
+            if format_spec not in self.format_selectors:
+                self.format_selectors[format_spec] = self.ydl.build_format_selector(format_spec)
+            params['format'] = format_spec
+            self.ydl.format_selector = self.format_selectors[format_spec]
+        self.progress_hook = progress_hook
+
+
+class YoutubeDLPool:
+    """Process-wide pool of long-lived YoutubeDL instances.
+
+    Building a YoutubeDL loads every extractor class and compiles its
+    options, which costs far more than a cached download. Callers check an
+    instance out for one call and return it afterwards, so instances outlive
+    the pipeline and job threads that borrow them; the pool only grows to
+    the number of calls ever in flight at once. The output template, format
+    and progress hook are swapped in per call.
+    """
+
+    def __init__(self, options: Optional[Dict] = None):
+        self.options = dict(options or YTDLP_OPTIONS)
+        # LIFO so the most recently used instance, with the warmest caches, goes out first
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self.created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def get(
+        self,
+        outtmpl: Optional[str] = None,
+        format_spec: Optional[str] = None,
+        progress_hook: Optional[ProgressHook] = None
+    ) -> Iterator[yt_dlp.YoutubeDL]:
+        """Check out an idle YoutubeDL (or build one) configured for one call."""
+        try:
+            pooled = self._idle.get_nowait()
+        except queue.Empty:
+            pooled = _PooledYoutubeDL(self.options)
+            with self._lock:
+                self.created += 1
+        pooled.configure(outtmpl, format_spec, progress_hook)
+        try:
+            yield pooled.ydl
+        finally:
+            pooled.progress_hook = None
+            self._idle.put(pooled)
+
+
+_shared_pools: Dict[str, YoutubeDLPool] = {}
+_shared_pools_lock = threading.Lock()
+
+
+def get_ydl_pool(profile: str = 'download') -> YoutubeDLPool:
+    """Return the process-wide pool for an options profile.
+
+    'download' uses YTDLP_OPTIONS as is; 'resolve' is the quiet variant used
+    for searches that do not download.
+    """
+    with _shared_pools_lock:
+        if profile not in _shared_pools:
+            options = dict(YTDLP_OPTIONS)
+            if profile == 'resolve':
+                options.update({'quiet': True, 'verbose': False})
+            elif profile != 'download':
+                raise ValueError(f"Unknown YoutubeDL profile: {profile}")
+            _shared_pools[profile] = YoutubeDLPool(options)
+        return _shared_pools[profile]
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import threading
+import time
+import logging
+from typing import Dict, List, Optional
+
+from config import YOUTUBE_INDEX_DB
+
+logger = logging.getLogger(__name__)
+
+INDEX_FIELDS = ('video_id', 'url', 'title', 'format_id', 'ext', 'acodec', 'abr', 'resolved_at')
+
+
+def video_entry(info: Dict) -> Dict:
+    """Build an index entry from a yt-dlp info dict."""
+    return {
+        'video_id': info['id'],
+        'url': info.get('webpage_url') or f"https://www.youtube.com/watch?v={info['id']}",
+        'title': info.get('title'),
+        'format_id': info.get('format_id'),
+        'ext': info.get('ext'),
+        'acodec': info.get('acodec'),
+        'abr': info.get('abr'),
+        'resolved_at': time.time(),
+    }
+
+
+class YouTubeIndex:
+    """Persistent mapping from Spotify track ID to the resolved YouTube video."""
+
+    def __init__(self, db_path: str = YOUTUBE_INDEX_DB):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS videos (
+                track_id TEXT PRIMARY KEY,
+                video_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                title TEXT,
+                format_id TEXT,
+                ext TEXT,
+                acodec TEXT,
+                abr REAL,
+                resolved_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, track_id: str) -> Optional[Dict]:
+        """Return the indexed video for a track, or None."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(INDEX_FIELDS)} FROM videos WHERE track_id = ?", (track_id,)
+            ).fetchone()
+        return dict(zip(INDEX_FIELDS, row)) if row else None
+
+    def put(self, track_id: str, entry: Dict):
+        """Store an index entry for a track."""
+        values = [entry.get(field) for field in INDEX_FIELDS]
+        values[INDEX_FIELDS.index('resolved_at')] = entry.get('resolved_at') or time.time()
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO videos (track_id, {', '.join(INDEX_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' for _ in INDEX_FIELDS)})",
+                [track_id] + values
+            )
+
+    def put_info(self, track_id: str, info: Dict) -> Dict:
+        """Index a yt-dlp info dict for a track and return the stored entry."""
+        entry = video_entry(info)
+        self.put(track_id, entry)
+        return entry
+
+    def delete(self, track_id: str):
+        """Forget the video resolved for a track."""
+        with self._lock:
+            self._db.execute('DELETE FROM videos WHERE track_id = ?', (track_id,))
+
+    def export_entries(self) -> Dict[str, Dict]:
+        """Return every index entry keyed by track ID."""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT track_id, {', '.join(INDEX_FIELDS)} FROM videos"
+            ).fetchall()
+        return {row[0]: dict(zip(INDEX_FIELDS, row[1:])) for row in rows}
+
+    def import_entries(self, entries: Dict[str, Dict], overwrite: bool = False) -> int:
+        """Merge entries into the index and return how many were written.
+
+        Existing entries win unless overwrite is set, or the incoming entry
+        was resolved more recently.
+        """
+        current = self.export_entries()
+        written = 0
+        for track_id, entry in entries.items():
+            existing = current.get(track_id)
+            if existing and not overwrite and (existing['resolved_at'] or 0) >= (entry.get('resolved_at') or 0):
+                continue
+            self.put(track_id, entry)
+            written += 1
+        return written
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM videos').fetchone()[0]
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_youtube_index() -> YouTubeIndex:
+    """Return the process-wide YouTube index."""
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = YouTubeIndex()
+        return _shared_index
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Manage the Spotify to YouTube resolution index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Write the index to a JSON file')
+    export_parser.add_argument('path', help='Output JSON file ("-" for stdout)')
+
+    import_parser = subparsers.add_parser('import', help='Merge a JSON export into the index')
+    import_parser.add_argument('path', help='Input JSON file ("-" for stdin)')
+    import_parser.add_argument('--overwrite', action='store_true', help='Replace existing entries')
+
+    warm_parser = subparsers.add_parser('warm', help='Resolve tracks without downloading them')
+    warm_parser.add_argument('urls', nargs='+', metavar='url', help='Spotify URLs to resolve')
+    warm_parser.add_argument('--max-concurrent', type=int, default=None,
+                             help='Maximum number of concurrent searches (optional)')
+
+    args = parser.parse_args(argv)
+    index = get_youtube_index()
+
+    if args.command == 'export':
+        entries = index.export_entries()
+        if args.path == '-':
+            json.dump(entries, sys.stdout, indent=2)
+        else:
+            with open(args.path, 'w') as f:
+                json.dump(entries, f, indent=2)
+            print(f"Exported {len(entries)} entries to {args.path}")
+
+    elif args.command == 'import':
+        if args.path == '-':
+            entries = json.load(sys.stdin)
+        else:
+            with open(args.path) as f:
+                entries = json.load(f)
+        written = index.import_entries(entries, overwrite=args.overwrite)
+        print(f"Imported {written} of {len(entries)} entries")
+
+    else:  # warm
+        from spotify_downloader import SpotifyDownloader
+        from utils import parse_spotify_urls
+
+        client_id = os.environ.get('SPOTIFY_CLIENT_ID')
+        client_secret = os.environ.get('SPOTIFY_CLIENT_SECRET')
+        if not client_id or not client_secret:
+            print("Error: Spotify credentials not found in environment")
+            sys.exit(1)
+
+        try:
+            downloader = SpotifyDownloader(client_id, client_secret)
+            _, tracks = downloader.resolve_tracks(parse_spotify_urls(' '.join(args.urls)))
+            resolved = downloader.warm_youtube_index(tracks, args.max_concurrent)
+            print(f"Resolved {resolved} tracks; index now holds {len(index)} entries")
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
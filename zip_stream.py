@@ -0,0 +1,52 @@
+import zipfile
+from typing import Iterable, Iterator, List, Tuple
+
+# Read size used when copying track files into the archive
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkBuffer:
+    """Write-only sink that collects what ZipFile writes until it is drained.
+
+    It deliberately has no seek/tell, so ZipFile treats it as an unseekable
+    stream and writes data descriptors instead of going back to patch headers.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        yield from chunks
+
+
+def iter_zip(entries: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+    """Yield a ZIP archive of (file path, archive name) entries as it is written.
+
+    Entries are stored rather than deflated (MP3/Opus/AAC do not compress) and
+    may be produced lazily, so tracks can be appended as they finish. Nothing
+    but the current chunk is held in memory and no archive is written to disk.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = zipfile.ZIP_STORED
+            force_zip64 = info.file_size > zipfile.ZIP64_LIMIT
+            with open(path, 'rb') as src, archive.open(info, 'w', force_zip64=force_zip64) as dest:
+                while True:
+                    chunk = src.read(ZIP_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield from buffer.drain()
+            yield from buffer.drain()
+    yield from buffer.drain()